@@ -0,0 +1,72 @@
+import time
+import hashlib
+import sqlite3
+import threading
+
+def cache_key(kind, *parts):
+    """Stable key for a prompt kind and the fingerprints/hashes it depends on"""
+    return hashlib.sha1("\x1f".join((kind,) + tuple(parts)).encode()).hexdigest()
+
+class AnalysisCache:
+    """Persistent LLM results keyed by error fingerprint, with TTL and LRU eviction"""
+    def __init__(self, db_path, ttl=86400, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_analyses_last_used
+                ON analyses (last_used);
+        """)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM analyses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.conn.execute(
+                "UPDATE analyses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, kind, value):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, kind, value, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, value, now, now)
+            )
+            # Expired rows go first, then the least recently used beyond the cap
+            self.conn.execute("DELETE FROM analyses WHERE created_at < ?", (now - self.ttl,))
+            self.conn.execute("""
+                DELETE FROM analyses WHERE key IN (
+                    SELECT key FROM analyses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self.conn.commit()
+
+    def get_or_compute(self, key, kind, compute):
+        """Cached value, or compute() stored for next time; errors are not cached"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, kind, value)
+        return value
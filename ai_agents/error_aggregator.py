@@ -0,0 +1,134 @@
+import time
+import sqlite3
+import threading
+
+class SpaceSaving:
+    """Top-k heavy hitters in bounded memory (Metwally et al. space-saving).
+
+    Each tracked key has a count that may overestimate by at most its
+    error, the count of the key it replaced.
+    """
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counters = {}
+
+    def add(self, key, sample=None):
+        counter = self.counters.get(key)
+        if counter is None:
+            if len(self.counters) < self.capacity:
+                counter = self.counters[key] = {'count': 0, 'error': 0, 'sample': sample}
+            else:
+                # Take over the smallest counter; its count becomes our error bound
+                smallest = min(self.counters, key=lambda k: self.counters[k]['count'])
+                floor = self.counters.pop(smallest)['count']
+                counter = self.counters[key] = {'count': floor, 'error': floor, 'sample': sample}
+        counter['count'] += 1
+        return counter['count']
+
+    def count(self, key):
+        counter = self.counters.get(key)
+        return counter['count'] if counter else 0
+
+    def top(self, n=10):
+        """(key, count, error, sample) for the n largest counts"""
+        ranked = sorted(self.counters.items(), key=lambda item: item[1]['count'], reverse=True)
+        return [(key, c['count'], c['error'], c['sample']) for key, c in ranked[:n]]
+
+class ErrorAggregator:
+    """Group errors by fingerprint and decide when an issue needs creating or updating.
+
+    The sketch ranks fingerprints in memory. Once an issue is filed, its
+    total and the occurrences not yet reported are counted in SQLite, so
+    updates stay correct across restarts and sketch evictions, and a
+    restart does not open duplicate issues. Increments are buffered and
+    written at most every flush_interval seconds.
+    """
+    def __init__(self, db_path, capacity=100, update_interval=900, flush_interval=5):
+        self.sketch = SpaceSaving(capacity)
+        self.update_interval = update_interval
+        self.flush_interval = flush_interval
+        self.unflushed = {}
+        self.last_flush = time.time()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS error_issues (
+                fingerprint TEXT PRIMARY KEY,
+                issue_number INTEGER,
+                total_count INTEGER NOT NULL DEFAULT 0,
+                pending_count INTEGER NOT NULL DEFAULT 0,
+                reported_at REAL NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def observe(self, key, message):
+        with self.lock:
+            self.unflushed[key] = self.unflushed.get(key, 0) + 1
+            if time.time() - self.last_flush >= self.flush_interval:
+                self.flush_locked()
+            return self.sketch.add(key, message)
+
+    def flush_locked(self):
+        """Add buffered occurrences to fingerprints that already have an issue"""
+        if self.unflushed:
+            self.conn.executemany(
+                """UPDATE error_issues SET total_count = total_count + ?, pending_count = pending_count + ?
+                   WHERE fingerprint = ?""",
+                [(n, n, key) for key, n in self.unflushed.items()]
+            )
+            self.conn.commit()
+            self.unflushed.clear()
+        self.last_flush = time.time()
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def top(self, n=10):
+        with self.lock:
+            return self.sketch.top(n)
+
+    def due(self, key, now=None):
+        """('create', count, 0), ('update', total, pending) or None"""
+        now = now or time.time()
+        with self.lock:
+            self.flush_locked()
+            row = self.conn.execute(
+                "SELECT total_count, pending_count, reported_at FROM error_issues WHERE fingerprint = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return 'create', self.sketch.count(key), 0
+        total, pending, reported_at = row
+        if pending > 0 and now - reported_at >= self.update_interval:
+            return 'update', total, pending
+        return None
+
+    def issue_number(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT issue_number FROM error_issues WHERE fingerprint = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark_created(self, key, count, issue_number, now=None):
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO error_issues (fingerprint, issue_number, total_count, pending_count, reported_at)
+                VALUES (?, ?, ?, 0, ?)
+                ON CONFLICT(fingerprint) DO UPDATE SET
+                    issue_number = excluded.issue_number,
+                    reported_at = excluded.reported_at
+            """, (key, issue_number, count, now or time.time()))
+            self.conn.commit()
+
+    def mark_updated(self, key, reported, now=None):
+        """Take the occurrences just reported off the pending count"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE error_issues SET pending_count = pending_count - ?, reported_at = ? WHERE fingerprint = ?",
+                (reported, now or time.time(), key)
+            )
+            self.conn.commit()
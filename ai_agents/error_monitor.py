@@ -2,12 +2,15 @@ import os
 import requests
 import json
 import time
+import asyncio
 import subprocess
-import smtplib
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
+from health_prober import HealthProber, parse_targets
+from error_window import ErrorWindow
+from llm_client import LLMClient
+from analysis_cache import AnalysisCache, cache_key
+from error_aggregator import ErrorAggregator
+from mail_sender import get_mail_sender
 
 # Load environment variables
 load_dotenv()
@@ -20,25 +23,53 @@ class ErrorMonitor:
         self.admin_email = os.getenv('ADMIN_EMAIL')
         self.bot_email = os.getenv('BOT_EMAIL')
         self.bot_password = os.getenv('BOT_PASSWORD')
+        self.mailer = get_mail_sender(self.bot_email, self.bot_password)
         self.hf_token = os.getenv('HF_TOKEN')
+        self.llm = LLMClient(self.hf_token)
+        # Repeat incidents reuse the stored analysis instead of calling the model
+        self.analysis_cache = AnalysisCache(
+            os.getenv('ANALYSIS_CACHE_DB', 'analysis_cache.db'),
+            ttl=float(os.getenv('ANALYSIS_CACHE_TTL', '86400')),
+            max_entries=int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '1000'))
+        )
         self.error_threshold = 10  # Errors per minute threshold
-        self.health_check_interval = 300  # 5 minutes
-        self.error_logs = []
+        self.health_check_interval = float(os.getenv('HEALTH_PROBE_INTERVAL', '15'))
+        self.error_rate_interval = 300  # 5 minutes
+        self.alert_cooldown = 3600  # 1 hour
+        self.errors = ErrorWindow(max_entries=int(os.getenv('ERROR_WINDOW_MAX_ENTRIES', '1000')))
+        # One issue per error fingerprint, updated with counts instead of re-filed
+        self.aggregator = ErrorAggregator(
+            os.getenv('ERROR_ISSUES_DB', 'error_issues.db'),
+            capacity=int(os.getenv('ERROR_AGGREGATOR_CAPACITY', '100')),
+            update_interval=float(os.getenv('ERROR_ISSUE_UPDATE_INTERVAL', '900'))
+        )
+        # Cooldowns are per alert kind so a warning never holds back a critical alert
+        self.last_alert_times = {}
+        self.recovery_task = None
+        self.background_tasks = set()
+        self.prober = HealthProber(
+            parse_targets(
+                os.getenv('HEALTH_TARGETS'),
+                self.api_url,
+                timeout=float(os.getenv('HEALTH_PROBE_TIMEOUT', '5')),
+                latency_slo_ms=float(os.getenv('HEALTH_LATENCY_SLO_MS', '500'))
+            ),
+            interval=self.health_check_interval,
+            on_alert=self.handle_probe_alert
+        )
         
-    def health_check(self):
-        """Check server health status"""
-        try:
-            response = requests.get(f"{self.api_url}/health", timeout=10)
-            return response.status_code == 200
-        except requests.RequestException:
-            return False
+    def record_error(self, message):
+        """Add an error to the rate window and the heavy-hitter summary"""
+        key = self.errors.add(message)
+        self.aggregator.observe(key, message)
+        return key
     
-    def analyze_logs(self):
+    def analyze_logs(self, key=None, sample=None):
         """Analyze error logs using AI"""
-        if not self.error_logs:
+        if not len(self.errors) and sample is None:
             return None
             
-        log_sample = "\n".join(self.error_logs[-5:])  # Last 5 errors
+        log_sample = sample or "\n".join(self.errors.recent(5))  # Last 5 errors
         prompt = f"""
         Analyze these application errors and suggest fixes:
         {log_sample}
@@ -50,26 +81,22 @@ class ErrorMonitor:
         4. Severity level (1-5)
         """
         
-        return self.query_ai(prompt)
+        # Same set of error fingerprints, same analysis
+        keys = [key] if key else self.errors.recent_fingerprints(5)
+        return self.query_ai(prompt, cache_key('analysis', *sorted(set(keys))))
     
-    def query_ai(self, prompt):
+    def generate(self, prompt, key=None, kind='analysis'):
+        """Model output for prompt, cached under key when given; raises on failure"""
+        if key is None:
+            return self.llm.generate(prompt, max_new_tokens=1000, temperature=0.7)
+        return self.analysis_cache.get_or_compute(
+            key, kind, lambda: self.llm.generate(prompt, max_new_tokens=1000, temperature=0.7)
+        )
+    
+    def query_ai(self, prompt, key=None):
         """Query Hugging Face AI model"""
-        headers = {"Authorization": f"Bearer {self.hf_token}"}
-        payload = {
-            "inputs": prompt,
-            "parameters": {
-                "max_new_tokens": 1000,
-                "temperature": 0.7
-            }
-        }
-        
         try:
-            response = requests.post(
-                "https://api-inference.huggingface.co/models/EleutherAI/gpt-neox-20b",
-                headers=headers,
-                json=payload
-            )
-            return response.json()[0]['generated_text']
+            return self.generate(prompt, key)
         except Exception as e:
             return f"AI query failed: {str(e)}"
     
@@ -89,7 +116,9 @@ class ErrorMonitor:
             Return only the fixed code with no explanations.
             """
             
-            fixed_code = self.query_ai(prompt)
+            # Never cached: the same file hash only comes back after a rollback,
+            # i.e. when the previous fix for it was bad
+            fixed_code = self.generate(prompt)
             
             # Create backup
             backup_path = f"{file_path}.bak.{int(time.time())}"
@@ -147,99 +176,164 @@ class ErrorMonitor:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            # The issue number, so later occurrences can be added to it
+            return response.json()['number'] if response.status_code == 201 else False
+        except Exception:
+            return False
+    
+    def comment_github_issue(self, issue_number, body):
+        """Add a comment to an existing GitHub issue"""
+        if not self.github_repo or not self.github_token:
+            return False
+        
+        url = f"https://api.github.com/repos/{self.github_repo}/issues/{issue_number}/comments"
+        headers = {
+            "Authorization": f"token {self.github_token}",
+            "Accept": "application/vnd.github.v3+json"
+        }
+        try:
+            response = requests.post(url, headers=headers, json={"body": body}, timeout=30)
             return response.status_code == 201
         except Exception:
             return False
     
+    def report_issue(self, key, title, describe):
+        """File one issue per fingerprint; later calls only add occurrence counts.
+        
+        describe() builds the issue body and is only called when filing.
+        """
+        action = self.aggregator.due(key)
+        if action is None:
+            return False
+        kind, count, new_since = action
+        
+        if kind == 'create':
+            body = f"{describe()}\n\nFingerprint: `{key}`\nOccurrences so far: {count}"
+            issue_number = self.create_github_issue(title, body)
+            if issue_number:
+                self.aggregator.mark_created(key, count, issue_number)
+            return bool(issue_number)
+        
+        issue_number = self.aggregator.issue_number(key)
+        if self.comment_github_issue(issue_number, f"Seen {new_since} more times ({count} total) since the last update."):
+            self.aggregator.mark_updated(key, new_since)
+            return True
+        return False
+    
     def send_alert_email(self, subject, body):
         """Send alert email to admin"""
         if not self.admin_email or not self.bot_email:
             return False
             
-        msg = MIMEMultipart()
-        msg['From'] = self.bot_email
-        msg['To'] = self.admin_email
-        msg['Subject'] = subject
+        return self.mailer.send(self.admin_email, subject, body)
+    
+    async def send_alert(self, kind, subject, body):
+        """Email the admin off the event loop, at most once per cooldown per kind"""
+        now = time.time()
+        if now - self.last_alert_times.get(kind, 0) <= self.alert_cooldown:
+            return False
+        self.last_alert_times[kind] = now
+        return await asyncio.to_thread(self.send_alert_email, subject, body)
+    
+    def handle_probe_alert(self, kind, target):
+        """React to prober state changes without blocking the probe loop"""
+        print(f"Health {kind}: {target.name} {target.url} {target.last_error or ''}")
+        if kind == 'down' and (self.recovery_task is None or self.recovery_task.done()):
+            self.recovery_task = asyncio.create_task(self.handle_outage(target))
+        elif kind == 'slo_breach':
+            latency = target.histogram.snapshot()
+            email_body = f"""
+            Latency SLO breached for {target.name} ({target.url})
+            
+            SLO: p{target.slo_percentile} <= {target.latency_slo_ms} ms
+            Current: p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, p99 {latency['p99_ms']} ms
+            """
+            task = asyncio.create_task(self.send_alert(
+                f"slo_breach:{target.name}", f"WARNING: {target.name} latency SLO breached", email_body
+            ))
+            self.background_tasks.add(task)
+            task.add_done_callback(self.background_tasks.discard)
+    
+    async def handle_outage(self, target):
+        """Analyze, attempt fixes and roll back while probes keep running"""
+        analysis = await asyncio.to_thread(self.analyze_logs) or "No analysis available"
+        
+        # Try automatic fixes for known patterns
+        if "database connection" in analysis.lower():
+            await asyncio.to_thread(self.restart_service)
+        elif "code error" in analysis.lower():
+            # Try to fix server/main.py
+            success, _ = await asyncio.to_thread(self.auto_fix_code, "server/main.py", analysis)
+            if success:
+                await asyncio.to_thread(self.restart_service)
+        
+        # Rollback if still failing after fixes
+        await asyncio.sleep(60)
+        if not target.healthy:
+            await asyncio.to_thread(self.rollback_code)
+            await asyncio.to_thread(self.restart_service)
         
-        msg.attach(MIMEText(body, 'plain'))
+        # Create GitHub issue, or count this outage on the existing one
+        issue_title = f"Critical Service Failure: {target.name}"
+        key = self.record_error(issue_title)
+        await asyncio.to_thread(self.report_issue, key, issue_title, lambda: analysis)
+        
+        email_body = f"""
+        Critical service failure detected on {target.name} ({target.url})!
+        
+        Analysis:
+        {analysis}
+        
+        Actions taken:
+        - Automatic fixes attempted
+        - Rollback to previous version
+        - Service restarted
+        
+        GitHub issue created for tracking.
+        """
+        await self.send_alert(f"down:{target.name}", "CRITICAL: Service Down", email_body)
+    
+    def check_error_rate(self):
+        """Report the top errors of the last minute when the rate exceeds the threshold"""
+        recent = self.errors.count('1m')
+        if recent <= self.error_threshold:
+            return
         
+        # Heavy hitters that are part of the current burst
+        active = set(self.errors.recent_fingerprints(recent))
+        for key, count, _, sample in [t for t in self.aggregator.top(10) if t[0] in active][:3]:
+            issue_title = f"High Error Rate: {sample[:80]}"
+            self.report_issue(
+                key, issue_title,
+                lambda: self.analyze_logs(key, sample) or "No analysis available"
+            )
+    
+    async def monitor_async(self):
+        """Probe every target each interval; recovery runs as a separate task"""
+        await self.prober.open()
+        last_error_rate_check = 0
         try:
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(self.bot_email, self.bot_password)
-            server.sendmail(self.bot_email, self.admin_email, msg.as_string())
-            server.quit()
-            return True
-        except Exception:
-            return False
+            while True:
+                started = time.monotonic()
+                await self.prober.probe_all()
+                for target in self.prober.targets:
+                    if target.consecutive_failures:
+                        self.record_error(f"Health check failed: {target.name} ({target.last_error})")
+                
+                # Check for high error rate
+                if time.monotonic() - last_error_rate_check >= self.error_rate_interval:
+                    last_error_rate_check = time.monotonic()
+                    await asyncio.to_thread(self.check_error_rate)
+                
+                await asyncio.sleep(max(0.0, self.health_check_interval - (time.monotonic() - started)))
+        finally:
+            await self.prober.close()
+            self.aggregator.flush()
     
     def monitor(self):
         """Main monitoring loop"""
-        error_count = 0
-        last_alert_time = 0
-        
-        while True:
-            # Health check
-            if not self.health_check():
-                error_count += 1
-                self.error_logs.append(f"{datetime.now()} - Health check failed")
-                
-                # Analyze after 3 consecutive failures
-                if error_count >= 3:
-                    analysis = self.analyze_logs() or "No analysis available"
-                    
-                    # Try automatic fixes for known patterns
-                    if "database connection" in analysis.lower():
-                        self.restart_service()
-                    elif "code error" in analysis.lower():
-                        # Try to fix server/main.py
-                        success, _ = self.auto_fix_code("server/main.py", analysis)
-                        if success:
-                            self.restart_service()
-                    
-                    # Rollback if still failing after fixes
-                    time.sleep(60)
-                    if not self.health_check():
-                        self.rollback_code()
-                        self.restart_service()
-                        
-                    # Create GitHub issue
-                    issue_title = "Critical Service Failure"
-                    self.create_github_issue(issue_title, analysis)
-                    
-                    # Send email alert if not sent recently
-                    if time.time() - last_alert_time > 3600:  # 1 hour cooldown
-                        email_body = f"""
-                        Critical service failure detected!
-                        
-                        Analysis:
-                        {analysis}
-                        
-                        Actions taken:
-                        - Automatic fixes attempted
-                        - Rollback to previous version
-                        - Service restarted
-                        
-                        GitHub issue created for tracking.
-                        """
-                        self.send_alert_email("CRITICAL: Service Down", email_body)
-                        last_alert_time = time.time()
-            
-            # Reset error count if healthy
-            else:
-                error_count = 0
-            
-            # Check for high error rate
-            recent_errors = [e for e in self.error_logs if 
-                            datetime.now() - datetime.strptime(e.split(' - ')[0], '%Y-%m-%d %H:%M:%S.%f') < timedelta(minutes=1)]
-            
-            if len(recent_errors) > self.error_threshold:
-                analysis = self.analyze_logs() or "No analysis available"
-                issue_title = "High Error Rate Detected"
-                self.create_github_issue(issue_title, analysis)
-            
-            time.sleep(self.health_check_interval)
+        asyncio.run(self.monitor_async())
 
 if __name__ == "__main__":
     monitor = ErrorMonitor()
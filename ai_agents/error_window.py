@@ -0,0 +1,105 @@
+import re
+import time
+import threading
+import hashlib
+from collections import deque
+from datetime import datetime
+
+# Rate windows in seconds
+WINDOWS = {'1m': 60, '5m': 300, '1h': 3600}
+
+VOLATILE_PATTERNS = [
+    (re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.I), '<uuid>'),
+    (re.compile(r'0x[0-9a-f]+', re.I), '<hex>'),
+    (re.compile(r'\b[0-9a-f]{16,}\b', re.I), '<hex>'),
+    (re.compile(r'(["\']).*?\1'), '<str>'),
+    (re.compile(r'\d+(\.\d+)*'), '<n>')
+]
+
+def normalize_error(message):
+    """Strip ids, numbers and quoted values so repeats of one error compare equal"""
+    for pattern, replacement in VOLATILE_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return ' '.join(message.split()).lower()
+
+def fingerprint(message):
+    return hashlib.sha1(normalize_error(message).encode()).hexdigest()[:12]
+
+class SlidingCounter:
+    """Event count over the last `window` seconds in per-second buckets"""
+    __slots__ = ('window', 'buckets', 'total')
+
+    def __init__(self, window):
+        self.window = window
+        self.buckets = deque()
+        self.total = 0
+
+    def add(self, ts, count=1):
+        second = int(ts)
+        if self.buckets and self.buckets[-1][0] == second:
+            self.buckets[-1][1] += count
+        else:
+            self.buckets.append([second, count])
+        self.total += count
+
+    def count(self, now):
+        cutoff = int(now) - self.window
+        while self.buckets and self.buckets[0][0] <= cutoff:
+            self.total -= self.buckets.popleft()[1]
+        return self.total
+
+class ErrorWindow:
+    """Recent errors in a bounded deque with sliding-window rate counters.
+
+    Entries older than `retention` seconds, or beyond `max_entries`, are
+    dropped; long-term counts per fingerprint live in ErrorAggregator.
+    Errors are recorded on the event loop while the rate check reads from
+    a worker thread, so every access holds the lock.
+    """
+    def __init__(self, max_entries=1000, retention=3600):
+        self.entries = deque()
+        self.max_entries = max_entries
+        self.retention = retention
+        self.counters = {name: SlidingCounter(seconds) for name, seconds in WINDOWS.items()}
+        self.lock = threading.Lock()
+
+    def add(self, message, ts=None):
+        ts = ts or time.time()
+        key = fingerprint(message)
+        with self.lock:
+            self.entries.append((ts, key, message))
+            for counter in self.counters.values():
+                counter.add(ts)
+                # Only '1m' is read regularly; trim the rest here so they stay bounded
+                counter.count(ts)
+            self.expire(ts)
+        return key
+
+    def expire(self, now):
+        while self.entries and (len(self.entries) > self.max_entries or now - self.entries[0][0] > self.retention):
+            self.entries.popleft()
+
+    def count(self, window='1m', now=None):
+        """Errors in the named window ('1m', '5m' or '1h')"""
+        with self.lock:
+            return self.counters[window].count(now or time.time())
+
+    def rates(self, now=None):
+        now = now or time.time()
+        with self.lock:
+            return {name: counter.count(now) for name, counter in self.counters.items()}
+
+    def recent(self, n=5):
+        """The last n errors as timestamped log lines"""
+        with self.lock:
+            start = max(0, len(self.entries) - n)
+            entries = list(self.entries)[start:]
+        return [f"{datetime.fromtimestamp(ts)} - {message}" for ts, _, message in entries]
+
+    def recent_fingerprints(self, n=5):
+        with self.lock:
+            start = max(0, len(self.entries) - n)
+            return [key for _, key, _ in list(self.entries)[start:]]
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+from security_monitor import PaymentGuard, FRAUD_FEATURES, NUMPY_MODEL_PATH, detect_fraud
+from fraud_runtime import NumpyFraudModel
+from fraud_rules import FraudRules
+from fraud_synthetic import generate_chunk
+
+KERAS_MODEL_PATH = 'resources/ml_models/fraud_detector.h5'
+KERAS_SCALER_PATH = 'resources/ml_models/fraud_scaler.pkl'
+
+# The training set calls the hour column time_of_day
+DATASET_COLUMNS = [name if name != 'hour' else 'time_of_day' for name in FRAUD_FEATURES]
+
+def load_dataset(data_dir, rows, seed):
+    """Features in FRAUD_FEATURES order and labels, from .npy columns or freshly generated"""
+    if data_dir:
+        columns = [np.load(os.path.join(data_dir, f'{name}.npy'), mmap_mode='r')[:rows] for name in DATASET_COLUMNS]
+        labels = np.load(os.path.join(data_dir, 'is_fraud.npy'), mmap_mode='r')[:rows]
+        return np.column_stack(columns).astype(np.float64), np.asarray(labels, dtype=np.int8)
+
+    data = generate_chunk(seed, rows)
+    features = np.column_stack([data[name] for name in DATASET_COLUMNS]).astype(np.float64)
+    return features, data['is_fraud'].astype(np.int8)
+
+def to_transactions(features):
+    """Row dicts for the scalar and remote scorers"""
+    transactions = []
+    for i, row in enumerate(features):
+        transaction = dict(zip(FRAUD_FEATURES, row.tolist()))
+        transaction.update({
+            'id': f"bench_{i}",
+            'user_id': f"user_{i % 1000}",
+            'currency': 'USD',
+            'ip': f"10.0.{i % 256}.{i % 251}",
+            'country': 'ZA',
+            'device': int(transaction['device_type'])
+        })
+        transactions.append(transaction)
+    return transactions
+
+def make_guard(model, scaler, threshold):
+    guard = PaymentGuard.__new__(PaymentGuard)
+    guard.feature_store = None
+    guard.rules = FraudRules(os.getenv('FRAUD_RULES_PATH'))
+    # Measure each model on every row, not just what the rules let through
+    guard.screen_rules = False
+    guard.fraud_model = model
+    guard.scaler = scaler
+    guard.anomaly_threshold = threshold
+    return guard
+
+def load_scorers(args):
+    """Every scorer that can run here, keyed by name"""
+    scorers = {'rules': make_guard(None, None, 0.85)}
+
+    if os.path.exists(args.npz):
+        for precision in args.precisions.split(','):
+            model = NumpyFraudModel(args.npz, precision=precision)
+            scorers[f'numpy_{precision}'] = make_guard(model, model.scaler, 0.92)
+
+    if os.path.exists(args.keras):
+        try:
+            from tensorflow.keras.models import load_model
+            import joblib
+            scorers['keras'] = make_guard(load_model(args.keras), joblib.load(args.keras_scaler), 0.92)
+        except ImportError as e:
+            print(f"Skipping keras scorer: {e}")
+    return scorers
+
+def percentile_ms(latencies, pct):
+    return round(float(np.percentile(latencies, pct)) * 1000, 3)
+
+def run_calls(guard, features, transactions, batch_size, max_calls):
+    """Score in calls of batch_size rows; returns per-call latencies and rows scored"""
+    latencies = []
+    rows = 0
+    for start in range(0, len(features), batch_size):
+        if len(latencies) >= max_calls:
+            break
+        begin = time.perf_counter()
+        if batch_size == 1:
+            guard.predict_fraud(transactions[start])
+        else:
+            guard.predict_fraud_batch(features[start:start + batch_size], batch_size=batch_size)
+        latencies.append(time.perf_counter() - begin)
+        rows += min(batch_size, len(features) - start)
+    return latencies, rows
+
+def bench_latency(guard, features, transactions, batch_size, max_calls):
+    latencies, rows = run_calls(guard, features, transactions, batch_size, max_calls)
+    elapsed = sum(latencies)
+
+    # Separate pass: tracemalloc slows allocation-heavy code down
+    tracemalloc.start()
+    run_calls(guard, features, transactions, batch_size, min(max_calls, 50))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'batch_size': batch_size,
+        'calls': len(latencies),
+        'rows': rows,
+        'rows_per_s': round(rows / elapsed, 1) if elapsed else None,
+        'p50_ms': percentile_ms(latencies, 50),
+        'p99_ms': percentile_ms(latencies, 99),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+def accuracy(decisions, labels):
+    predicted = decisions.astype(bool)
+    actual = labels.astype(bool)
+    true_positive = int(np.sum(predicted & actual))
+    flagged = int(np.sum(predicted))
+    fraud = int(np.sum(actual))
+    return {
+        'flagged': flagged,
+        'precision': round(true_positive / flagged, 4) if flagged else None,
+        'recall': round(true_positive / fraud, 4) if fraud else None
+    }
+
+def agreement(decisions):
+    """Fraction of rows on which each pair of scorers makes the same call"""
+    names = list(decisions)
+    result = {}
+    for i, first in enumerate(names):
+        for second in names[i + 1:]:
+            n = min(len(decisions[first]), len(decisions[second]))
+            result[f"{first}/{second}"] = round(float(np.mean(decisions[first][:n] == decisions[second][:n])), 4)
+    return result
+
+def run(args):
+    features, labels = load_dataset(args.data_dir, args.rows, args.seed)
+    transactions = to_transactions(features[:args.max_calls])
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+
+    results = []
+    decisions = {}
+    for name, guard in load_scorers(args).items():
+        scores = guard.predict_fraud_batch(features, batch_size=max(batch_sizes))
+        decisions[name] = scores >= guard.anomaly_threshold
+        results.append({
+            'scorer': name,
+            **accuracy(decisions[name], labels),
+            'latency': [
+                bench_latency(guard, features, transactions, batch_size, args.max_calls)
+                for batch_size in batch_sizes
+            ]
+        })
+        print(f"Benchmarked {name}")
+
+    if args.remote_samples:
+        # Costs API quota; only a sample, one call at a time
+        sample = to_transactions(features[:args.remote_samples])
+        latencies = []
+        remote = []
+        for transaction in sample:
+            begin = time.perf_counter()
+            try:
+                remote.append(bool(detect_fraud(transaction)))
+            except Exception as e:
+                print(f"Remote fraud check failed: {str(e)}")
+                remote.append(False)
+            latencies.append(time.perf_counter() - begin)
+        decisions['remote'] = np.array(remote)
+        results.append({
+            'scorer': 'remote',
+            **accuracy(decisions['remote'], labels[:len(remote)]),
+            'latency': [{
+                'batch_size': 1,
+                'calls': len(latencies),
+                'rows': len(latencies),
+                'rows_per_s': round(len(latencies) / sum(latencies), 2),
+                'p50_ms': percentile_ms(latencies, 50),
+                'p99_ms': percentile_ms(latencies, 99)
+            }]
+        })
+
+    return {
+        'rows': len(features),
+        'fraud_rate': round(float(labels.mean()), 4),
+        'results': results,
+        'agreement': agreement(decisions)
+    }
+
+if __name__ == "__main__":
+    # Run from the repository root: python ai_agents/fraud_benchmark.py
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", help="Column files written by generate_fraud_detector.py --generate")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--batch-sizes", default="1,32,256,4096")
+    parser.add_argument("--max-calls", type=int, default=2000,
+                        help="Cap on timed calls per scorer and batch size")
+    parser.add_argument("--precisions", default="float64,float32,int8")
+    parser.add_argument("--npz", default=NUMPY_MODEL_PATH)
+    parser.add_argument("--keras", default=KERAS_MODEL_PATH)
+    parser.add_argument("--keras-scaler", default=KERAS_SCALER_PATH)
+    parser.add_argument("--remote-samples", type=int, default=0,
+                        help="Also send this many transactions to the remote model")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,245 @@
+import os
+import json
+import math
+import time
+from datetime import datetime, timezone
+
+# (bucket width in seconds, bucket count) for each rolling window
+WINDOWS = {
+    '1h': (60, 60),
+    '24h': (3600, 24),
+    '7d': (6 * 3600, 28)
+}
+
+class RollingCounter:
+    """Count and sum over a sliding window kept in a ring of time buckets"""
+    __slots__ = ('width', 'counts', 'sums', 'epochs')
+
+    def __init__(self, width, size):
+        self.width = width
+        self.counts = [0] * size
+        self.sums = [0.0] * size
+        self.epochs = [-1] * size
+
+    def add(self, ts, value=0.0, count=1):
+        epoch = int(ts // self.width)
+        slot = epoch % len(self.counts)
+        if epoch < self.epochs[slot]:
+            # A late event older than the whole window; never clobber a newer bucket
+            return
+        if epoch > self.epochs[slot]:
+            # The slot still holds an expired bucket; recycle it
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+            self.sums[slot] = 0.0
+        self.counts[slot] += count
+        self.sums[slot] += value
+
+    def totals(self, now):
+        oldest = int(now // self.width) - len(self.counts)
+        count, total = 0, 0.0
+        for epoch, c, s in zip(self.epochs, self.counts, self.sums):
+            if epoch > oldest:
+                count += c
+                total += s
+        return count, total
+
+    def to_dict(self):
+        return {'width': self.width, 'counts': self.counts, 'sums': self.sums, 'epochs': self.epochs}
+
+    @classmethod
+    def from_dict(cls, data):
+        counter = cls(data['width'], len(data['counts']))
+        counter.counts, counter.sums, counter.epochs = data['counts'], data['sums'], data['epochs']
+        return counter
+
+def last_bucket_end(counters):
+    """Latest time covered by any bucket, for snapshots without last_seen"""
+    return max(((max(c.epochs) + 1) * c.width for c in counters if max(c.epochs) >= 0), default=0)
+
+def new_windows():
+    return {name: RollingCounter(width, size) for name, (width, size) in WINDOWS.items()}
+
+class FraudFeatureStore:
+    """Per-user and per-IP rolling aggregates that feed PaymentGuard.
+
+    update() is O(1) per transaction; lookups scan a few dozen buckets.
+    State can be snapshotted to JSON and reloaded on restart. Users idle
+    for user_idle_ttl seconds, and IPs idle for longer than the 7d window,
+    are expired before each snapshot so neither the dicts nor the file
+    grow without bound.
+    """
+    MAX_IP_USERS = 64
+    IP_IDLE_TTL = WINDOWS['7d'][0] * WINDOWS['7d'][1]
+
+    def __init__(self, user_idle_ttl=30 * 86400):
+        self.users = {}
+        self.ips = {}
+        self.user_idle_ttl = user_idle_ttl
+        # Stream position the aggregates include, saved with each snapshot
+        self.cursor = None
+
+    def user_state(self, user_id):
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = {'windows': new_windows(), 'home_country': None, 'last_seen': 0}
+        return state
+
+    def ip_state(self, ip):
+        state = self.ips.get(ip)
+        if state is None:
+            state = self.ips[ip] = {'windows': new_windows(), 'fraud': RollingCounter(*WINDOWS['7d']), 'users': {}, 'last_seen': 0}
+        return state
+
+    def update(self, transaction, ts=None):
+        """Fold one transaction into the user and IP aggregates"""
+        ts = ts or transaction.get('created') or time.time()
+        amount = float(transaction.get('amount', 0))
+
+        user = self.user_state(transaction['user_id'])
+        user['last_seen'] = max(user['last_seen'], ts)
+        for counter in user['windows'].values():
+            counter.add(ts, amount)
+        if user['home_country'] is None and transaction.get('country'):
+            user['home_country'] = transaction['country']
+
+        ip = transaction.get('ip')
+        if ip:
+            state = self.ip_state(ip)
+            state['last_seen'] = max(state['last_seen'], ts)
+            for counter in state['windows'].values():
+                counter.add(ts, amount)
+            users = state['users']
+            users[transaction['user_id']] = ts
+            if len(users) > self.MAX_IP_USERS:
+                # Forget the user seen longest ago
+                del users[min(users, key=users.get)]
+
+    def record_outcome(self, transaction, is_fraud, ts=None):
+        """Feed confirmed fraud back so the IP risk score learns from it"""
+        ip = transaction.get('ip')
+        if ip and is_fraud:
+            ts = ts or transaction.get('created') or time.time()
+            state = self.ip_state(ip)
+            state['last_seen'] = max(state['last_seen'], ts)
+            state['fraud'].add(ts)
+
+    def features(self, transaction, now=None):
+        """Model features derived from history, excluding this transaction"""
+        now = now or transaction.get('created') or time.time()
+        user = self.users.get(transaction['user_id'])
+        features = {}
+
+        if user:
+            for name, counter in user['windows'].items():
+                count, total = counter.totals(now)
+                features[f'user_count_{name}'] = count
+                features[f'user_amount_{name}'] = total
+            home = user['home_country']
+        else:
+            for name in WINDOWS:
+                features[f'user_count_{name}'] = 0
+                features[f'user_amount_{name}'] = 0.0
+            home = None
+        features['customer_history'] = features['user_count_7d']
+
+        country = transaction.get('country')
+        features['location_mismatch'] = int(bool(home and country and country != home))
+        features['ip_risk_score'] = self.ip_risk_score(transaction.get('ip'), now)
+        return features
+
+    def ip_risk_score(self, ip, now):
+        """0-1 risk from IP velocity, account sharing and confirmed fraud"""
+        state = self.ips.get(ip) if ip else None
+        if state is None:
+            return 0.0
+
+        count_1h, _ = state['windows']['1h'].totals(now)
+        count_7d, _ = state['windows']['7d'].totals(now)
+        fraud_7d, _ = state['fraud'].totals(now)
+        recent_users = sum(1 for seen in state['users'].values() if now - seen < 86400)
+
+        velocity = 1 - math.exp(-count_1h / 20)
+        sharing = min(1.0, max(0, recent_users - 1) / 5)
+        fraud_rate = fraud_7d / max(1, count_7d)
+        return min(1.0, max(fraud_rate, 0.5 * velocity + 0.5 * sharing))
+
+    def enrich(self, transaction):
+        """Return the transaction with computed features, then record it"""
+        ts = transaction.get('created') or time.time()
+        enriched = {**transaction, **self.features(transaction, ts)}
+        if 'hour' not in enriched or 'day_of_week' not in enriched:
+            moment = datetime.fromtimestamp(ts, tz=timezone.utc)
+            enriched.setdefault('hour', moment.hour)
+            enriched.setdefault('day_of_week', moment.weekday())
+        self.update(transaction, ts)
+        return enriched
+
+    def expire(self, now=None):
+        """Drop idle users and IPs; returns how many keys were removed"""
+        now = now or time.time()
+        idle_users = [k for k, state in self.users.items() if now - state['last_seen'] > self.user_idle_ttl]
+        idle_ips = [k for k, state in self.ips.items() if now - state['last_seen'] > self.IP_IDLE_TTL]
+        for user_id in idle_users:
+            del self.users[user_id]
+        for ip in idle_ips:
+            del self.ips[ip]
+        return len(idle_users) + len(idle_ips)
+
+    def snapshot(self, path, cursor=None, now=None):
+        """Write all aggregates, and the stream cursor they cover, to disk atomically"""
+        if cursor is not None:
+            self.cursor = cursor
+        self.expire(now or (cursor or {}).get('created'))
+        data = {
+            'cursor': self.cursor,
+            'users': {
+                user_id: {
+                    'windows': {n: c.to_dict() for n, c in state['windows'].items()},
+                    'home_country': state['home_country'],
+                    'last_seen': state['last_seen']
+                }
+                for user_id, state in self.users.items()
+            },
+            'ips': {
+                ip: {
+                    'windows': {n: c.to_dict() for n, c in state['windows'].items()},
+                    'fraud': state['fraud'].to_dict(),
+                    'users': state['users'],
+                    'last_seen': state['last_seen']
+                }
+                for ip, state in self.ips.items()
+            }
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, user_idle_ttl=30 * 86400):
+        store = cls(user_idle_ttl)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return store
+
+        store.cursor = data.get('cursor')
+        for user_id, state in data['users'].items():
+            windows = {n: RollingCounter.from_dict(c) for n, c in state['windows'].items()}
+            store.users[user_id] = {
+                'windows': windows,
+                'home_country': state['home_country'],
+                'last_seen': state.get('last_seen', last_bucket_end(windows.values()))
+            }
+        for ip, state in data['ips'].items():
+            windows = {n: RollingCounter.from_dict(c) for n, c in state['windows'].items()}
+            fraud = RollingCounter.from_dict(state['fraud'])
+            store.ips[ip] = {
+                'windows': windows,
+                'fraud': fraud,
+                'users': state['users'],
+                'last_seen': state.get('last_seen', last_bucket_end([*windows.values(), fraud]))
+            }
+        return store
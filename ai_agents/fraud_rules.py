@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import operator
+import numpy as np
+
+# Used when no rules file is configured; mirrors the patterns the
+# synthetic training data is labelled with
+DEFAULT_RULES = {
+    'threshold': 1.0,
+    'rules': [
+        {
+            'name': 'large_foreign_risky_ip',
+            'weight': 1.0,
+            'all': [
+                {'field': 'amount', 'op': '>', 'value': 500},
+                {'field': 'location_mismatch', 'op': '==', 'value': 1},
+                {'field': 'ip_risk_score', 'op': '>', 'value': 0.8}
+            ]
+        },
+        {
+            'name': 'night_purchase_risky_merchant',
+            'weight': 1.0,
+            'all': [
+                {'field': 'amount', 'op': '>', 'value': 300},
+                {'field': 'hour', 'op': '<', 'value': 6},
+                {'field': 'merchant_category', 'op': '==', 'value': 3}
+            ]
+        },
+        {
+            'name': 'large_new_customer',
+            'weight': 1.0,
+            'all': [
+                {'field': 'customer_history', 'op': '<', 'value': 2},
+                {'field': 'amount', 'op': '>', 'value': 700}
+            ]
+        }
+    ]
+}
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+def compile_condition(condition):
+    """(scalar predicate, vector predicate) for one field comparison"""
+    field = condition['field']
+    op = condition['op']
+    value = condition['value']
+
+    if op == 'in':
+        allowed = frozenset(value)
+        values = np.array(sorted(value))
+        return (lambda t: t[field] in allowed), (lambda cols: np.isin(cols[field], values))
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown operator {op!r} in rule condition on {field}")
+    if not isinstance(value, (int, float)):
+        raise ValueError(f"Rule condition on {field} needs a numeric value")
+
+    compare = OPERATORS[op]
+    return (lambda t: compare(t[field], value)), (lambda cols: compare(np.asarray(cols[field]), value))
+
+class Rule:
+    """A weighted conjunction ('all') or disjunction ('any') of conditions"""
+    def __init__(self, spec):
+        self.name = spec['name']
+        self.weight = float(spec.get('weight', 1.0))
+        if 'all' in spec:
+            self.combine, conditions = 'all', spec['all']
+        elif 'any' in spec:
+            self.combine, conditions = 'any', spec['any']
+        else:
+            raise ValueError(f"Rule {self.name} needs an 'all' or 'any' list")
+        self.fields = {c['field'] for c in conditions}
+
+        compiled = [compile_condition(c) for c in conditions]
+        scalars = tuple(scalar for scalar, _ in compiled)
+        self.vectors = tuple(vector for _, vector in compiled)
+        if self.combine == 'all':
+            self.matches = lambda t: all(check(t) for check in scalars)
+        else:
+            self.matches = lambda t: any(check(t) for check in scalars)
+
+    def matches_batch(self, columns):
+        masks = [vector(columns) for vector in self.vectors]
+        reduce = np.logical_and if self.combine == 'all' else np.logical_or
+        return reduce.reduce(masks) if len(masks) > 1 else masks[0]
+
+class RuleSet:
+    """Compiled rules: score is the capped sum of matching rule weights"""
+    def __init__(self, spec):
+        self.threshold = float(spec.get('threshold', 1.0))
+        self.rules = [Rule(rule) for rule in spec['rules']]
+        self.fields = set().union(*(rule.fields for rule in self.rules)) if self.rules else set()
+
+    def score(self, transaction):
+        total = 0.0
+        for rule in self.rules:
+            if rule.matches(transaction):
+                total += rule.weight
+        return min(total, 1.0)
+
+    def score_batch(self, columns):
+        """Vectorized score over a mapping of column name to array"""
+        n = len(next(iter(columns.values())))
+        total = np.zeros(n)
+        for rule in self.rules:
+            total += rule.matches_batch(columns) * rule.weight
+        return np.minimum(total, 1.0)
+
+    def flag(self, transaction):
+        return self.score(transaction) >= self.threshold
+
+    def flag_batch(self, columns):
+        return self.score_batch(columns) >= self.threshold
+
+class FraudRules:
+    """Rule set loaded from a JSON file and recompiled when the file changes.
+
+    A bad edit is reported and the previous rules stay active. Without a
+    file the built-in DEFAULT_RULES apply.
+    """
+    def __init__(self, path=None, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.mtime = None
+        self.last_check = 0.0
+        self.rule_set = RuleSet(DEFAULT_RULES)
+        self.reload()
+
+    def reload(self):
+        self.last_check = time.time()
+        if not self.path:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self.mtime:
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                self.rule_set = RuleSet(json.load(f))
+            print(f"Loaded {len(self.rule_set.rules)} fraud rules from {self.path}")
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Keeping previous fraud rules, {self.path} is invalid: {str(e)}")
+        self.mtime = mtime
+
+    def current(self):
+        """The active rule set, checking the file at most every check_interval seconds"""
+        if time.time() - self.last_check >= self.check_interval:
+            self.reload()
+        return self.rule_set
@@ -0,0 +1,70 @@
+import numpy as np
+
+ACTIVATIONS = {
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+    'tanh': np.tanh,
+    'linear': lambda x: x
+}
+
+class NumpyScaler:
+    """StandardScaler parameters applied without scikit-learn"""
+    def __init__(self, mean, scale, dtype=np.float32):
+        self.mean = mean.astype(dtype)
+        self.scale = scale.astype(dtype)
+        self.dtype = dtype
+
+    def transform(self, features):
+        return (np.asarray(features, dtype=self.dtype) - self.mean) / self.scale
+
+def quantize_weights(weights):
+    """Symmetric per-column int8 quantization; returns (int8 weights, float scales)"""
+    scale = np.abs(weights).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    quantized = np.clip(np.round(weights / scale), -127, 127).astype(np.int8)
+    return quantized, scale.astype(np.float32)
+
+class NumpyFraudModel:
+    """Forward pass of the exported fraud MLP using only NumPy.
+
+    Loads the .npz written by generate_fraud_detector.export_numpy_model,
+    whose weights are float32, or int8 with a W{i}_scale array per layer.
+    precision is 'float64', 'float32' (default) or 'int8'. int8 keeps the
+    weights as int8 in memory (quantizing float32 files at load) and applies
+    the per-column scales after each float32 matmul: a quarter of the weight
+    memory for some quantization error, and no faster than float32.
+    """
+    def __init__(self, path, precision='float32'):
+        if precision not in ('float64', 'float32', 'int8'):
+            raise ValueError(f"Unsupported precision: {precision}")
+        self.precision = precision
+        dtype = np.float64 if precision == 'float64' else np.float32
+
+        with np.load(path) as data:
+            self.scaler = NumpyScaler(data['scaler_mean'], data['scaler_scale'], dtype)
+            activations = [str(a) for a in data['activations']]
+            self.layers = []
+            for i, activation in enumerate(activations):
+                weights = data[f'W{i}']
+                scale = data[f'W{i}_scale'] if f'W{i}_scale' in data else None
+                bias = data[f'b{i}'].astype(dtype)
+                if precision == 'int8':
+                    if scale is None:
+                        weights, scale = quantize_weights(weights)
+                    scale = scale.astype(dtype)
+                else:
+                    # Full precision: fold any stored scales back into the weights
+                    weights = weights.astype(dtype) if scale is None else weights.astype(dtype) * scale.astype(dtype)
+                    scale = None
+                self.layers.append((weights, scale, bias, ACTIVATIONS[activation]))
+        self.dtype = dtype
+
+    def predict(self, features, batch_size=None, verbose=0):
+        """Score scaled features; returns an (n, 1) array like Keras"""
+        x = np.asarray(features, dtype=self.dtype)
+        for weights, scale, bias, activation in self.layers:
+            x = x @ weights
+            if scale is not None:
+                x *= scale
+            x = activation(x + bias)
+        return x.reshape(-1, 1)
@@ -0,0 +1,35 @@
+import os
+import numpy as np
+from fraud_rules import FraudRules
+
+# Labels come from the same rule set PaymentGuard screens with
+fraud_rules = FraudRules(os.getenv('FRAUD_RULES_PATH'))
+
+def generate_chunk(seed, num_samples, noise_rate=0.02):
+    """One independent chunk of synthetic transactions as column arrays"""
+    rng = np.random.RandomState(seed)
+    
+    # Features: transaction amount, time, location, frequency, etc.
+    data = {
+        'amount': rng.exponential(100, num_samples),
+        'time_of_day': rng.randint(0, 24, num_samples),
+        'day_of_week': rng.randint(0, 7, num_samples),
+        'merchant_category': rng.randint(0, 10, num_samples),
+        'customer_history': rng.poisson(5, num_samples),
+        'device_type': rng.choice([0, 1, 2], num_samples),
+        'location_mismatch': rng.choice([0, 1], num_samples, p=[0.7, 0.3]),
+        'ip_risk_score': rng.beta(0.5, 0.5, num_samples)
+    }
+    
+    # Fraud rules (synthetic patterns); the rule set calls time_of_day 'hour'
+    is_fraud = fraud_rules.current().flag_batch({**data, 'hour': data['time_of_day']}).astype(int)
+    
+    # Add noise
+    fraud_indices = np.flatnonzero(is_fraud == 1)
+    is_fraud[fraud_indices[:len(fraud_indices)//3]] = 0
+    
+    non_fraud_indices = np.flatnonzero(is_fraud == 0)
+    is_fraud[non_fraud_indices[:int(num_samples * noise_rate)]] = 1
+    
+    data['is_fraud'] = is_fraud
+    return data
@@ -0,0 +1,160 @@
+import time
+import asyncio
+import bisect
+from collections import deque
+import aiohttp
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is open
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 75, 100, 150, 250, 400, 600, 1000, 1500, 2500, 5000, 10000]
+
+class LatencyHistogram:
+    """Bucketed latencies over a sliding time window"""
+    def __init__(self, window=900, max_samples=10000):
+        self.window = window
+        self.samples = deque(maxlen=max_samples)
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, latency_ms, now=None):
+        now = now or time.time()
+        if len(self.samples) == self.samples.maxlen:
+            self.counts[self.samples[0][1]] -= 1
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+        self.samples.append((now, bucket))
+        self.counts[bucket] += 1
+        self.expire(now)
+
+    def expire(self, now):
+        while self.samples and now - self.samples[0][0] > self.window:
+            _, bucket = self.samples.popleft()
+            self.counts[bucket] -= 1
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th sample, None if empty"""
+        total = len(self.samples)
+        if not total:
+            return None
+        rank = max(1, int(round(total * pct / 100)))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[bucket] if bucket < len(LATENCY_BUCKETS_MS) else float('inf')
+
+    def snapshot(self):
+        return {
+            'samples': len(self.samples),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'buckets': dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ['inf'], self.counts))
+        }
+
+class ProbeTarget:
+    def __init__(self, name, url, timeout=5.0, latency_slo_ms=500, slo_percentile=95, expected_status=200):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self.latency_slo_ms = latency_slo_ms
+        self.slo_percentile = slo_percentile
+        self.expected_status = expected_status
+        self.histogram = LatencyHistogram()
+        self.consecutive_failures = 0
+        self.healthy = True
+        self.slo_breached = False
+        self.last_error = None
+
+class HealthProber:
+    """Probe many endpoints concurrently on one pooled session.
+
+    on_alert(kind, target) is called on state changes only: 'down' after
+    failure_threshold consecutive failures, 'recovered', 'slo_breach' when
+    the rolling latency percentile exceeds the target's SLO, and 'slo_ok'.
+    """
+    def __init__(self, targets, interval=15.0, failure_threshold=3, min_slo_samples=10, on_alert=None):
+        self.targets = targets
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.min_slo_samples = min_slo_samples
+        self.on_alert = on_alert or (lambda kind, target: None)
+        self.session = None
+
+    async def probe(self, target):
+        start = time.perf_counter()
+        try:
+            async with self.session.get(target.url, timeout=aiohttp.ClientTimeout(total=target.timeout)) as response:
+                await response.read()
+                ok = response.status == target.expected_status
+                target.last_error = None if ok else f"HTTP {response.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            ok = False
+            target.last_error = str(e) or type(e).__name__
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        if ok:
+            target.histogram.add(latency_ms)
+        self.record(target, ok)
+        return ok
+
+    def record(self, target, ok):
+        if ok:
+            target.consecutive_failures = 0
+            if not target.healthy:
+                target.healthy = True
+                self.on_alert('recovered', target)
+        else:
+            target.consecutive_failures += 1
+            if target.healthy and target.consecutive_failures >= self.failure_threshold:
+                target.healthy = False
+                self.on_alert('down', target)
+
+        histogram = target.histogram
+        if len(histogram.samples) < self.min_slo_samples:
+            return
+        breached = histogram.percentile(target.slo_percentile) > target.latency_slo_ms
+        if breached != target.slo_breached:
+            target.slo_breached = breached
+            self.on_alert('slo_breach' if breached else 'slo_ok', target)
+
+    async def probe_all(self):
+        return await asyncio.gather(*(self.probe(target) for target in self.targets))
+
+    async def open(self):
+        connector = aiohttp.TCPConnector(limit=max(10, len(self.targets)), keepalive_timeout=max(30, self.interval * 2))
+        self.session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def run(self):
+        await self.open()
+        try:
+            while True:
+                started = time.monotonic()
+                await self.probe_all()
+                # Keep a steady cadence however long the slowest probe took
+                await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        finally:
+            await self.close()
+
+    def status(self):
+        return {
+            target.name: {
+                'url': target.url,
+                'healthy': target.healthy,
+                'slo_breached': target.slo_breached,
+                'consecutive_failures': target.consecutive_failures,
+                'last_error': target.last_error,
+                'latency': target.histogram.snapshot()
+            }
+            for target in self.targets
+        }
+
+def parse_targets(spec, default_url, timeout=5.0, latency_slo_ms=500):
+    """Targets from 'name=url,name=url'; falls back to the production /health endpoint"""
+    targets = []
+    for entry in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, url = entry.partition('=')
+        targets.append(ProbeTarget(name, url, timeout, latency_slo_ms))
+    return targets or [ProbeTarget('api', f"{default_url}/health", timeout, latency_slo_ms)]
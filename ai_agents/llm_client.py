@@ -0,0 +1,46 @@
+import os
+import hashlib
+import requests
+
+HF_MODEL_URL = "https://api-inference.huggingface.co/models/EleutherAI/gpt-neox-20b"
+
+def stub_generate(prompt, max_new_tokens, temperature):
+    """Deterministic local completion for tests and offline runs"""
+    digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+    return f"{prompt.strip()}\n\n[stub completion {digest}]"
+
+class LLMClient:
+    """Text generation through the Hugging Face inference API or a local stub.
+
+    LLM_BACKEND=stub (or backend='stub') never touches the network; pass
+    stub=callable(prompt, max_new_tokens, temperature) to script replies.
+    """
+    def __init__(self, token=None, model_url=HF_MODEL_URL, backend=None, timeout=60, stub=None):
+        self.token = token or os.getenv('HF_TOKEN')
+        self.model_url = model_url
+        self.backend = backend or os.getenv('LLM_BACKEND', 'huggingface')
+        self.timeout = timeout
+        self.stub = stub or stub_generate
+        self.session = requests.Session()
+        self.calls = 0
+
+    def generate(self, prompt, max_new_tokens=500, temperature=0.7):
+        """Completion text; raises on transport or API errors"""
+        self.calls += 1
+        if self.backend == 'stub':
+            return self.stub(prompt, max_new_tokens, temperature)
+
+        response = self.session.post(
+            self.model_url,
+            headers={"Authorization": f"Bearer {self.token}"},
+            json={
+                "inputs": prompt,
+                "parameters": {
+                    "max_new_tokens": max_new_tokens,
+                    "temperature": temperature
+                }
+            },
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()[0]['generated_text']
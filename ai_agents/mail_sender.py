@@ -0,0 +1,189 @@
+import os
+import time
+import queue
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+class TokenBucket:
+    """Blocking token bucket: acquire() waits until a send is allowed"""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class SMTPPool:
+    """Authenticated SMTP sessions reused across sends.
+
+    A session is replaced after max_messages sends or max_idle seconds
+    unused, since providers drop long-lived or idle connections.
+    """
+    def __init__(self, host, port, user, password, size=4, max_messages=90, max_idle=240, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_messages = max_messages
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.Semaphore(size)
+
+    def connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.starttls()
+        server.login(self.user, self.password)
+        return {'server': server, 'sent': 0, 'last_used': time.monotonic()}
+
+    def close(self, session):
+        try:
+            session['server'].quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def acquire(self):
+        self.slots.acquire()
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - session['last_used'] < self.max_idle:
+                return session
+            self.close(session)
+        try:
+            return self.connect()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, session, healthy=True):
+        if healthy and session['sent'] < self.max_messages:
+            session['last_used'] = time.monotonic()
+            self.idle.put(session)
+        else:
+            self.close(session)
+        self.slots.release()
+
+    def sendmail(self, sender, recipient, message):
+        session = self.acquire()
+        try:
+            session['server'].sendmail(sender, recipient, message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+            # Stale connection: retry once on a fresh one
+            self.release(session, healthy=False)
+            session = self.acquire()
+            try:
+                session['server'].sendmail(sender, recipient, message)
+            except Exception:
+                self.release(session, healthy=False)
+                raise
+        except smtplib.SMTPRecipientsRefused:
+            # The session is still usable
+            self.release(session)
+            raise
+        except Exception:
+            self.release(session, healthy=False)
+            raise
+        session['sent'] += 1
+        self.release(session)
+
+    def close_all(self):
+        while True:
+            try:
+                self.close(self.idle.get_nowait())
+            except queue.Empty:
+                return
+
+class MailSender:
+    """Send mail through a session pool, a worker pool and a token-bucket rate limit"""
+    def __init__(self, user, password, host='smtp.gmail.com', port=587, workers=4,
+                 rate_per_minute=20, burst=5):
+        self.sender = user
+        self.pool = SMTPPool(host, port, user, password, size=workers)
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mail")
+        self.lock = threading.Lock()
+        self.progress = {'queued': 0, 'sent': 0, 'failed': 0}
+
+    def build(self, to_email, subject, body):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        return msg.as_string()
+
+    def send(self, to_email, subject, body):
+        """Send one message now, within the rate limit; returns True on success"""
+        self.bucket.acquire()
+        try:
+            self.pool.sendmail(self.sender, to_email, self.build(to_email, subject, body))
+            self.track('sent')
+            return True
+        except Exception as e:
+            print(f"Email to {to_email} failed: {str(e)}")
+            self.track('failed')
+            return False
+
+    def track(self, key):
+        with self.lock:
+            self.progress[key] += 1
+
+    def send_many(self, messages, on_result=None):
+        """Send (to, subject, body, context) tuples concurrently.
+
+        Messages are submitted as the iterable yields them, so slow message
+        preparation overlaps with sending. on_result(context, ok) runs in
+        the worker as each send finishes. Returns (sent, failed).
+        """
+        def deliver(to_email, subject, body, context):
+            ok = self.send(to_email, subject, body)
+            if on_result:
+                on_result(context, ok)
+            return ok
+
+        futures = []
+        for to_email, subject, body, context in messages:
+            self.track('queued')
+            futures.append(self.executor.submit(deliver, to_email, subject, body, context))
+
+        results = [future.result() for future in futures]
+        sent = sum(results)
+        return sent, len(results) - sent
+
+mail_senders = {}
+mail_senders_lock = threading.Lock()
+
+def get_mail_sender(user=None, password=None):
+    """Process-wide sender per account, configured from the environment"""
+    user = user or os.getenv('BOT_EMAIL')
+    password = password or os.getenv('BOT_PASSWORD')
+    with mail_senders_lock:
+        sender = mail_senders.get(user)
+        if sender is None:
+            sender = mail_senders[user] = MailSender(
+                user, password,
+                host=os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+                port=int(os.getenv('SMTP_PORT', '587')),
+                workers=int(os.getenv('SMTP_WORKERS', '4')),
+                rate_per_minute=float(os.getenv('SMTP_RATE_PER_MINUTE', '20')),
+                burst=int(os.getenv('SMTP_BURST', '5'))
+            )
+        return sender
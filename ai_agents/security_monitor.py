@@ -2,13 +2,48 @@ import requests
 import os
 import time
 import json
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
-from tensorflow.keras.models import load_model
-import joblib
+from fraud_runtime import NumpyFraudModel
+from fraud_features import FraudFeatureStore
+from fraud_rules import FraudRules
+
+NUMPY_MODEL_PATH = 'resources/ml_models/fraud_detector.npz'
+
+# Model input columns, in the order used by generate_fraud_detector.py
+FRAUD_FEATURES = [
+    'amount',
+    'hour',
+    'day_of_week',
+    'merchant_category',
+    'customer_history',
+    'device_type',
+    'location_mismatch',
+    'ip_risk_score'
+]
 
 class PaymentGuard:
-    def __init__(self):
+    def __init__(self, feature_store=None):
+        # Derives history, IP and location features the model expects
+        self.feature_store = feature_store
+        # Declarative rules: the fallback scorer and a screen ahead of the model
+        self.rules = FraudRules(os.getenv('FRAUD_RULES_PATH'))
+        self.screen_rules = os.getenv('FRAUD_RULES_SCREEN', '1') == '1'
+        
+        # Prefer the NumPy export: no TensorFlow import, millisecond startup
+        if os.path.exists(NUMPY_MODEL_PATH):
+            self.fraud_model = NumpyFraudModel(
+                NUMPY_MODEL_PATH,
+                precision=os.getenv('FRAUD_MODEL_PRECISION', 'float32')
+            )
+            self.scaler = self.fraud_model.scaler
+            self.anomaly_threshold = 0.92
+            return
+        
         try:
+            from tensorflow.keras.models import load_model
+            import joblib
             self.fraud_model = load_model('resources/ml_models/fraud_detector.h5')
             self.scaler = joblib.load('resources/ml_models/fraud_scaler.pkl')
             self.anomaly_threshold = 0.92
@@ -17,11 +52,23 @@ class PaymentGuard:
             self.scaler = None
             self.anomaly_threshold = 0.85
         
+    def enrich(self, transaction):
+        """Fill in stored rolling features, recording the transaction"""
+        if self.feature_store is None:
+            return transaction
+        return self.feature_store.enrich(transaction)
+    
     def predict_fraud(self, transaction):
+        transaction = self.enrich(transaction)
+        rules = self.rules.current()
         if not self.fraud_model or not self.scaler:
-            # Fallback to simple rules
-            return transaction['amount'] > 500 and transaction['location_mismatch']
-        
+            # Fallback to the rule set
+            return rules.score(transaction)
+
+        # Same screen as the batch path: a rule hit is blocked without the model
+        if self.screen_rules and rules.flag(transaction):
+            return 1.0
+
         # Prepare features
         features = np.array([
             transaction['amount'],
@@ -39,12 +86,53 @@ class PaymentGuard:
         
         # Predict fraud probability
         return self.fraud_model.predict(features)[0][0]
+    
+    def to_feature_matrix(self, transactions):
+        """Build an (n, 8) float matrix from dicts, a column mapping or an array"""
+        if isinstance(transactions, np.ndarray):
+            return np.asarray(transactions, dtype=np.float64).reshape(-1, len(FRAUD_FEATURES))
+        
+        # Columnar input: dict of arrays or a DataFrame
+        if hasattr(transactions, 'keys'):
+            return np.column_stack([
+                np.asarray(transactions[name], dtype=np.float64) for name in FRAUD_FEATURES
+            ])
+        
+        matrix = np.empty((len(transactions), len(FRAUD_FEATURES)), dtype=np.float64)
+        for i, transaction in enumerate(transactions):
+            matrix[i] = [float(transaction[name]) for name in FRAUD_FEATURES]
+        return matrix
+    
+    def predict_fraud_batch(self, transactions, batch_size=4096):
+        """Score many transactions in one pass; returns an array of fraud scores"""
+        if self.feature_store is not None and isinstance(transactions, list):
+            transactions = [self.feature_store.enrich(t) for t in transactions]
+        features = self.to_feature_matrix(transactions)
+        if len(features) == 0:
+            return np.zeros(0)
+        
+        rules = self.rules.current()
+        columns = {name: features[:, i] for i, name in enumerate(FRAUD_FEATURES)}
+        if not self.fraud_model or not self.scaler:
+            # Same rules as the scalar fallback, vectorized
+            return rules.score_batch(columns)
+        
+        scores = np.ones(len(features))
+        remaining = ~rules.flag_batch(columns) if self.screen_rules else np.ones(len(features), dtype=bool)
+        if remaining.any():
+            # One scaler call and large model batches amortize framework overhead
+            scaled = self.scaler.transform(features[remaining])
+            scores[remaining] = self.fraud_model.predict(scaled, batch_size=batch_size, verbose=0).ravel()
+        return scores
 
 load_dotenv()
 
 FRAUD_MODEL_API = "https://api-inference.huggingface.co/models/elastic/distilbert-base-uncased-finetuned-conll03-english"
 HEADERS = {"Authorization": f"Bearer {os.getenv('HF_TOKEN')}"}
 
+# Pooled connection for remote fraud checks
+remote_session = requests.Session()
+
 def detect_fraud(transaction):
     """Use AI model to detect fraudulent transactions"""
     payload = {
@@ -58,7 +146,7 @@ def detect_fraud(transaction):
         """
     }
     
-    response = requests.post(FRAUD_MODEL_API, headers=HEADERS, json=payload)
+    response = remote_session.post(FRAUD_MODEL_API, headers=HEADERS, json=payload, timeout=15)
     result = response.json()
     
     # Extract fraud probability
@@ -70,22 +158,145 @@ def detect_fraud(transaction):
     
     return fraud_score > 0.85
 
-def monitor_transactions():
-    """Continuously monitor transactions"""
-    while True:
+class TransactionStreamMonitor:
+    """Score new transactions in micro-batches from a persisted cursor.
+
+    The local PaymentGuard model decides clear cases; only scores in the
+    borderline band are sent to the remote model, at most max_remote at a
+    time. A borderline case the remote model cannot decide is queued for
+    review. The cursor advances once every transaction in a batch is
+    decided, and is saved before the feature snapshot; the snapshot records
+    the cursor it covers so a restart replays only the gap into the store.
+    """
+    def __init__(self, guard, cursor_path='fraud_monitor_cursor.json', batch_size=256,
+                 poll_interval=2.0, borderline_low=0.5, max_remote=4, remote_timeout=30,
+                 features_path=None, snapshot_interval=60, review_path='fraud_review_queue.jsonl'):
+        self.guard = guard
+        self.review_path = review_path
+        self.features_path = features_path
+        self.snapshot_interval = snapshot_interval
+        self.last_snapshot = time.time()
+        self.cursor_path = cursor_path
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.borderline_low = borderline_low
+        self.block_threshold = guard.anomaly_threshold
+        self.remote_timeout = remote_timeout
+        self.remote_pool = ThreadPoolExecutor(max_workers=max_remote, thread_name_prefix="fraud-remote")
+        self.cursor = self.load_cursor()
+        self.catch_up_features()
+    
+    def load_cursor(self):
         try:
-            # Get recent transactions (pseudo-code)
-            transactions = get_recent_transactions()
-            
+            with open(self.cursor_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+    
+    def save_cursor(self, transaction):
+        self.cursor = {'created': transaction['created'], 'id': transaction['id']}
+        tmp_path = f"{self.cursor_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.cursor, f)
+        os.replace(tmp_path, self.cursor_path)
+    
+    def save_features(self, force=False):
+        """Snapshot the feature store at most every snapshot_interval seconds"""
+        store = self.guard.feature_store
+        if store is None or not self.features_path:
+            return
+        if force or time.time() - self.last_snapshot >= self.snapshot_interval:
+            store.snapshot(self.features_path, cursor=self.cursor)
+            self.last_snapshot = time.time()
+    
+    def catch_up_features(self):
+        """Fold transactions scored after the last feature snapshot into the store"""
+        store = self.guard.feature_store
+        if store is None or store.cursor is None or self.cursor is None:
+            return
+        
+        end = (self.cursor['created'], self.cursor['id'])
+        cursor = store.cursor
+        while (cursor['created'], cursor['id']) < end:
+            transactions = get_transactions_since(cursor, self.batch_size)
+            if not transactions:
+                break
             for transaction in transactions:
-                if detect_fraud(transaction):
-                    block_transaction(transaction['id'])
-                    alert_admin(transaction)
-            
-            time.sleep(300)  # Check every 5 minutes
-        except Exception as e:
-            print(f"Monitoring error: {str(e)}")
-            time.sleep(60)
+                if (transaction['created'], transaction['id']) > end:
+                    return
+                store.update(transaction)
+                cursor = {'created': transaction['created'], 'id': transaction['id']}
+    
+    def process_batch(self, transactions):
+        """Block clear fraud locally and resolve borderline cases remotely"""
+        scores = self.guard.predict_fraud_batch(transactions)
+        
+        flagged = []
+        borderline = {}
+        for transaction, score in zip(transactions, scores):
+            if score >= self.block_threshold:
+                flagged.append(transaction)
+            elif score >= self.borderline_low:
+                borderline[self.remote_pool.submit(detect_fraud, transaction)] = transaction
+        
+        # Act on local decisions before waiting for the remote model
+        for transaction in flagged:
+            block_transaction(transaction['id'])
+            alert_admin(transaction)
+        
+        # Undecided cases are queued for review before the cursor moves past them
+        done, not_done = wait(borderline, timeout=self.remote_timeout)
+        for future in done:
+            try:
+                is_fraud = future.result()
+            except Exception as e:
+                print(f"Remote fraud check failed: {str(e)}")
+                queue_for_review(borderline[future], f"remote check failed: {e}", self.review_path)
+                continue
+            if is_fraud:
+                block_transaction(borderline[future]['id'])
+                alert_admin(borderline[future])
+        for future in not_done:
+            future.cancel()
+            print(f"Remote fraud check timed out for transaction {borderline[future]['id']}")
+            queue_for_review(borderline[future], "remote check timed out", self.review_path)
+        
+        return len(flagged), len(borderline)
+    
+    def run(self):
+        while True:
+            try:
+                transactions = get_transactions_since(self.cursor, self.batch_size)
+                if not transactions:
+                    time.sleep(self.poll_interval)
+                    continue
+                
+                self.process_batch(transactions)
+                # Cursor first: a crash before the snapshot is caught up on
+                # restart, whereas the reverse order would count the batch twice
+                self.save_cursor(transactions[-1])
+                self.save_features()
+            except Exception as e:
+                print(f"Monitoring error: {str(e)}")
+                time.sleep(self.poll_interval)
+
+def monitor_transactions():
+    """Continuously monitor transactions"""
+    features_path = os.getenv('FRAUD_FEATURES_PATH', 'fraud_features.json')
+    feature_store = FraudFeatureStore.load(
+        features_path,
+        user_idle_ttl=float(os.getenv('FRAUD_FEATURES_IDLE_TTL', str(30 * 86400)))
+    )
+    monitor = TransactionStreamMonitor(
+        PaymentGuard(feature_store=feature_store),
+        cursor_path=os.getenv('FRAUD_MONITOR_CURSOR', 'fraud_monitor_cursor.json'),
+        poll_interval=float(os.getenv('FRAUD_MONITOR_POLL_INTERVAL', '2')),
+        max_remote=int(os.getenv('FRAUD_MONITOR_MAX_REMOTE', '4')),
+        features_path=features_path,
+        snapshot_interval=float(os.getenv('FRAUD_FEATURES_SNAPSHOT_INTERVAL', '60')),
+        review_path=os.getenv('FRAUD_REVIEW_QUEUE', 'fraud_review_queue.jsonl')
+    )
+    monitor.run()
 
 def block_transaction(transaction_id):
     """Block a fraudulent transaction"""
@@ -97,7 +308,21 @@ def alert_admin(transaction):
     print(f"ALERT: Fraud detected in transaction {transaction['id']}")
     # Implement actual alert system
 
+def queue_for_review(transaction, reason, path='fraud_review_queue.jsonl'):
+    """Durably hold a transaction the monitor could not decide for manual review"""
+    print(f"Queued transaction {transaction['id']} for review: {reason}")
+    with open(path, 'a') as f:
+        f.write(json.dumps({'transaction': transaction, 'reason': reason, 'queued_at': time.time()}, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
 def get_recent_transactions():
     """Retrieve recent transactions (stub implementation)"""
     # This would connect to your database in production
     return []
+
+def get_transactions_since(cursor, limit):
+    """Transactions after the (created, id) cursor, oldest first (stub implementation)"""
+    # This would run an indexed range query against your database in production:
+    # WHERE (created, id) > (cursor.created, cursor.id) ORDER BY created, id LIMIT limit
+    return []
@@ -1,44 +1,52 @@
 import os
-import smtplib
 import json
 import time
+import hashlib
 import requests
 import random
-from datetime import datetime
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from sponsor_store import SponsorStore
+from mail_sender import get_mail_sender
+from llm_client import LLMClient
+from analysis_cache import AnalysisCache, cache_key
 
 # Load environment variables
 load_dotenv()
 
+# Generated bodies are shared by every sponsor in an industry; the name is filled in per email
+COMPANY_PLACEHOLDER = "{company}"
+
 class SponsorBot:
     def __init__(self):
         self.bot_email = os.getenv('BOT_EMAIL')
         self.bot_password = os.getenv('BOT_PASSWORD')
         self.hf_token = os.getenv('HF_TOKEN')
         self.api_url = os.getenv('PRODUCTION_URL', 'https://arena-x.onrender.com')
-        self.sponsor_db = "sponsors.json"
+        self.api_key = os.getenv('API_KEY')
+        self.mailer = get_mail_sender(self.bot_email, self.bot_password)
+        self.store = SponsorStore(os.getenv('SPONSOR_DB', 'sponsors.db'))
+        self.store.migrate_json("sponsors.json")
         self.templates = {
             'initial': "templates/initial_template.txt",
             'followup': "templates/followup_template.txt",
             'tournament': "templates/tournament_template.txt"
         }
-        self.sponsors = self.load_sponsors()
+        self.template_cache = {}
+        self.llm = LLMClient(self.hf_token)
+        self.generation_cache = AnalysisCache(
+            os.getenv('PERSONALIZATION_CACHE_DB', 'personalization_cache.db'),
+            ttl=float(os.getenv('PERSONALIZATION_CACHE_TTL', '604800')),
+            max_entries=int(os.getenv('PERSONALIZATION_CACHE_MAX_ENTRIES', '5000'))
+        )
+        self.llm_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv('PERSONALIZATION_WORKERS', '4')),
+            thread_name_prefix="personalize"
+        )
+        # Segments whose generation failed this campaign fall back to the plain template
+        self.failed_segments = set()
         
-    def load_sponsors(self):
-        """Load sponsor database"""
-        try:
-            with open(self.sponsor_db, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-    
-    def save_sponsors(self):
-        """Save sponsor database"""
-        with open(self.sponsor_db, 'w') as f:
-            json.dump(self.sponsors, f, indent=2)
-    
     def find_new_sponsors(self):
         """Find potential sponsors using AI"""
         prompt = """
@@ -48,105 +56,97 @@ class SponsorBot:
         """
         
         try:
-            headers = {"Authorization": f"Bearer {self.hf_token}"}
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_new_tokens": 500,
-                    "temperature": 0.7
-                }
-            }
-            
-            response = requests.post(
-                "https://api-inference.huggingface.co/models/EleutherAI/gpt-neox-20b",
-                headers=headers,
-                json=payload
-            )
+            result = self.llm.generate(prompt, max_new_tokens=500, temperature=0.7)
             
             # Extract JSON from response
-            result = response.json()[0]['generated_text']
             start = result.find('[')
             end = result.rfind(']') + 1
             new_sponsors = json.loads(result[start:end])
             
-            # Add to database if not exists
-            for sponsor in new_sponsors:
-                if not any(s['email'] == sponsor['email'] for s in self.sponsors):
-                    sponsor.update({
-                        "last_contact": None,
-                        "status": "new",
-                        "responses": []
-                    })
-                    self.sponsors.append(sponsor)
-            
-            self.save_sponsors()
+            # Add to database if not exists (email is the primary key)
+            added = self.store.add_new(new_sponsors)
+            print(f"Discovered {added} new sponsors")
             return True
         except Exception as e:
             print(f"Sponsor discovery failed: {str(e)}")
             return False
     
-    def personalize_email(self, sponsor, template_type):
-        """Personalize email using AI"""
-        # Get template
+    def load_template(self, template_type):
+        """Template text, re-read only when the file changes"""
+        path = self.templates[template_type]
         try:
-            with open(self.templates[template_type], 'r') as f:
-                template = f.read()
+            mtime = os.stat(path).st_mtime
         except FileNotFoundError:
-            template = ""
+            return ""
         
+        cached = self.template_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'r') as f:
+            template = f.read()
+        self.template_cache[path] = (mtime, template)
+        return template
+    
+    def generate_for_segment(self, industry, template_type, tournament=None):
+        """Email body for one (industry, template, tournament), cached with a TTL"""
+        template = self.load_template(template_type)
+        tournament_line = f"Mention our upcoming {tournament} tournament." if tournament else ""
         prompt = f"""
-        Personalize this sponsorship email for {sponsor['name']} in {sponsor['industry']}:
+        Personalize this sponsorship email for a company in {industry}.
+        Refer to the company only as {COMPANY_PLACEHOLDER}.
         
         Template:
         {template}
         
+        {tournament_line}
         Include specific reasons why ArenaX would be valuable for their industry.
         Keep it under 200 words.
         """
         
+        key = cache_key(
+            'personalization', industry or '', template_type, tournament or '',
+            hashlib.sha1(template.encode()).hexdigest()
+        )
+        return self.generation_cache.get_or_compute(
+            key, 'personalization',
+            lambda: self.llm.generate(prompt, max_new_tokens=500, temperature=0.7)
+        )
+    
+    def personalize_email(self, sponsor, template_type, tournament=None):
+        """Personalize email using AI"""
+        segment = (sponsor['industry'], template_type, tournament)
+        if segment in self.failed_segments:
+            return self.load_template(template_type)
         try:
-            headers = {"Authorization": f"Bearer {self.hf_token}"}
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_new_tokens": 500,
-                    "temperature": 0.7
-                }
-            }
-            
-            response = requests.post(
-                "https://api-inference.huggingface.co/models/EleutherAI/gpt-neox-20b",
-                headers=headers,
-                json=payload
-            )
-            return response.json()[0]['generated_text']
+            body = self.generate_for_segment(*segment)
         except Exception:
-            return template
+            self.failed_segments.add(segment)
+            return self.load_template(template_type)
+        return body.replace(COMPANY_PLACEHOLDER, sponsor['name'])
+    
+    def prefetch_personalizations(self, segments):
+        """Generate the uncached (industry, template, tournament) bodies concurrently"""
+        self.failed_segments = set()
+        futures = {self.llm_pool.submit(self.generate_for_segment, *segment): segment for segment in set(segments)}
+        for future, segment in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Personalization failed: {str(e)}")
+                self.failed_segments.add(segment)
     
     def send_email(self, to_email, subject, body):
         """Send email to sponsor"""
-        msg = MIMEMultipart()
-        msg['From'] = self.bot_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        try:
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(self.bot_email, self.bot_password)
-            server.sendmail(self.bot_email, to_email, msg.as_string())
-            server.quit()
-            return True
-        except Exception as e:
-            print(f"Email failed: {str(e)}")
-            return False
+        return self.mailer.send(to_email, subject, body)
     
     def get_tournament_data(self):
         """Get upcoming tournament data from API"""
         try:
-            response = requests.get(f"{self.api_url}/tournaments/upcoming")
+            response = requests.get(
+                f"{self.api_url}/tournaments/upcoming",
+                headers={"X-API-Key": self.api_key},
+                timeout=10
+            )
             if response.status_code == 200:
                 return response.json()
             return None
@@ -163,47 +163,62 @@ class SponsorBot:
         tournaments = self.get_tournament_data() or []
         featured_tournament = tournaments[0] if tournaments else None
         
-        # Process sponsors
-        for sponsor in self.sponsors:
-            # Skip recently contacted
-            if sponsor.get('last_contact') and \
-               (datetime.now() - datetime.fromisoformat(sponsor['last_contact'])).days < 7:
-                continue
-                
-            # Determine email type
-            if sponsor['status'] == 'new':
-                email_type = 'initial'
-            elif sponsor['status'] == 'contacted' and featured_tournament:
-                email_type = 'tournament'
-            else:
-                email_type = 'followup'
-            
-            # Personalize email
-            subject = f"Sponsorship Opportunity with ArenaX Esports"
-            if email_type == 'tournament':
-                subject = f"Feature Your Brand in our {featured_tournament['name']} Tournament"
-            
-            body = self.personalize_email(sponsor, email_type)
-            
-            # Add tournament details
-            if featured_tournament and email_type == 'tournament':
-                body += f"\n\nTournament Details:\n"
-                body += f"Name: {featured_tournament['name']}\n"
-                body += f"Date: {featured_tournament['date']}\n"
-                body += f"Expected Participants: {featured_tournament['participants']}\n"
-                body += f"Prize Pool: ${featured_tournament['prize_pool']}\n"
+        # Sponsors not contacted in the last 7 days
+        sponsors = self.store.due_for_contact(datetime.now() - timedelta(days=7))
+        
+        # One generation per distinct segment, in parallel, before composing
+        self.prefetch_personalizations(
+            self.segment(sponsor, featured_tournament) for sponsor in sponsors
+        )
+        
+        # Pacing is left to the mail sender's rate limit
+        messages = (self.compose(sponsor, featured_tournament) for sponsor in sponsors)
+        
+        def record(sponsor, ok):
+            # Each send is recorded as it lands, so a rerun resumes where this stopped
+            if ok:
+                self.store.mark_contacted(sponsor['email'], campaign_type)
+        
+        sent, failed = self.mailer.send_many(messages, on_result=record)
+        print(f"Campaign {campaign_type}: {sent} sent, {failed} failed")
+        return sent, failed
+    
+    def email_type(self, sponsor, featured_tournament):
+        if sponsor['status'] == 'new':
+            return 'initial'
+        elif sponsor['status'] == 'contacted' and featured_tournament:
+            return 'tournament'
+        return 'followup'
+    
+    def segment(self, sponsor, featured_tournament):
+        """The (industry, template, tournament) a sponsor's email body depends on"""
+        email_type = self.email_type(sponsor, featured_tournament)
+        tournament = featured_tournament['name'] if email_type == 'tournament' else None
+        return sponsor['industry'], email_type, tournament
+    
+    def compose(self, sponsor, featured_tournament):
+        """(to, subject, body, sponsor) for one campaign email"""
+        # Determine email type
+        _, email_type, tournament = self.segment(sponsor, featured_tournament)
+        
+        # Personalize email
+        subject = f"Sponsorship Opportunity with ArenaX Esports"
+        if email_type == 'tournament':
+            subject = f"Feature Your Brand in our {featured_tournament['name']} Tournament"
+        
+        body = self.personalize_email(sponsor, email_type, tournament)
+        
+        # Add tournament details
+        if featured_tournament and email_type == 'tournament':
+            body += f"\n\nTournament Details:\n"
+            body += f"Name: {featured_tournament['name']}\n"
+            body += f"Date: {featured_tournament['date']}\n"
+            body += f"Expected Participants: {featured_tournament['participants']}\n"
+            body += f"Prize Pool: ${featured_tournament['prize_pool']}\n"
+            if featured_tournament.get('sponsorship_fee'):
                 body += f"Sponsorship Package: ${featured_tournament['sponsorship_fee']}"
-            
-            # Send email
-            if self.send_email(sponsor['email'], subject, body):
-                # Update sponsor record
-                sponsor['last_contact'] = datetime.now().isoformat()
-                sponsor['status'] = 'contacted'
-                sponsor['campaign'] = campaign_type
-                self.save_sponsors()
-                
-                # Space out emails
-                time.sleep(random.randint(60, 300))  # 1-5 minutes
+        
+        return sponsor['email'], subject, body, sponsor
     
     def handle_response(self, email_text):
         """Handle email responses using AI"""
@@ -220,27 +235,21 @@ class SponsorBot:
         Return in JSON format: {{"sentiment": "", "next_steps": "", "talking_points": ""}}
         """
         
+        # Identical replies ("Not interested at this time.") share one analysis
+        key = cache_key('sponsor_response', ' '.join(email_text.lower().split()))
+        cached = self.generation_cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        
         try:
-            headers = {"Authorization": f"Bearer {self.hf_token}"}
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_new_tokens": 300,
-                    "temperature": 0.5
-                }
-            }
-            
-            response = requests.post(
-                "https://api-inference.huggingface.co/models/EleutherAI/gpt-neox-20b",
-                headers=headers,
-                json=payload
-            )
+            result = self.llm.generate(prompt, max_new_tokens=300, temperature=0.5)
             
             # Extract JSON from response
-            result = response.json()[0]['generated_text']
             start = result.find('{')
             end = result.rfind('}') + 1
-            return json.loads(result[start:end])
+            analysis = json.loads(result[start:end])
+            self.generation_cache.put(key, 'sponsor_response', json.dumps(analysis))
+            return analysis
         except Exception:
             return {"sentiment": "unknown", "next_steps": "Follow up in 7 days", "talking_points": ""}
     
@@ -248,29 +257,30 @@ class SponsorBot:
         """Process email responses (simplified version)"""
         # In production, this would connect to an IMAP server
         # For demo, we'll simulate processing
-        for sponsor in self.sponsors:
-            if sponsor['status'] == 'contacted' and random.random() < 0.2:  # 20% chance of response
+        replies = []
+        for sponsor in self.store.with_status('contacted'):
+            if random.random() < 0.2:  # 20% chance of response
                 response_types = [
                     "We're interested! Send more details.",
                     "Not interested at this time.",
                     "What are your sponsorship tiers?"
                 ]
-                response = random.choice(response_types)
-                analysis = self.handle_response(response)
-                
-                # Update sponsor record
-                sponsor['responses'].append({
-                    "date": datetime.now().isoformat(),
-                    "response": response,
-                    "analysis": analysis
-                })
-                
-                if analysis['sentiment'] == 'positive':
-                    sponsor['status'] = 'hot-lead'
-                elif analysis['sentiment'] == 'negative':
-                    sponsor['status'] = 'closed'
-                
-                self.save_sponsors()
+                replies.append((sponsor, random.choice(response_types)))
+        
+        # Analyze each distinct reply once, concurrently on the bounded pool
+        unique = list(dict.fromkeys(response for _, response in replies))
+        analyses = dict(zip(unique, self.llm_pool.map(self.handle_response, unique)))
+        
+        for sponsor, response in replies:
+            analysis = analyses[response]
+            status = None
+            if analysis['sentiment'] == 'positive':
+                status = 'hot-lead'
+            elif analysis['sentiment'] == 'negative':
+                status = 'closed'
+            
+            # Update sponsor record
+            self.store.add_response(sponsor['email'], response, analysis, status)
 
 if __name__ == "__main__":
     bot = SponsorBot()
@@ -0,0 +1,164 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+COLUMNS = ('email', 'name', 'industry', 'status', 'last_contact', 'campaign')
+
+class SponsorStore:
+    """Sponsors in SQLite keyed by email, indexed for campaign selection.
+
+    Every change is a single-row statement; responses live in their own
+    table so appending one never rewrites the sponsor.
+    """
+    def __init__(self, db_path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sponsors (
+                email TEXT PRIMARY KEY,
+                name TEXT,
+                industry TEXT,
+                status TEXT NOT NULL DEFAULT 'new',
+                last_contact TEXT,
+                campaign TEXT,
+                extra TEXT NOT NULL DEFAULT '{}'
+            );
+            CREATE INDEX IF NOT EXISTS idx_sponsors_status_contact
+                ON sponsors (status, last_contact);
+            CREATE INDEX IF NOT EXISTS idx_sponsors_last_contact
+                ON sponsors (last_contact);
+            CREATE TABLE IF NOT EXISTS sponsor_responses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT NOT NULL REFERENCES sponsors (email),
+                date TEXT NOT NULL,
+                response TEXT,
+                analysis TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_sponsor_responses_email
+                ON sponsor_responses (email);
+        """)
+        self.conn.commit()
+
+    def row_to_sponsor(self, row, responses=None):
+        sponsor = json.loads(row['extra'])
+        sponsor.update({column: row[column] for column in COLUMNS})
+        if responses is not None:
+            sponsor['responses'] = responses
+        return sponsor
+
+    def split(self, sponsor):
+        """Known columns plus a JSON blob of any other fields"""
+        extra = {k: v for k, v in sponsor.items() if k not in COLUMNS and k != 'responses'}
+        values = [sponsor.get(column) for column in COLUMNS]
+        values[COLUMNS.index('status')] = sponsor.get('status') or 'new'
+        return values, json.dumps(extra)
+
+    def add_new(self, sponsors):
+        """Insert sponsors not seen before; returns how many were added"""
+        rows = []
+        for sponsor in sponsors:
+            if not sponsor.get('email'):
+                continue
+            values, extra = self.split({**sponsor, 'status': 'new', 'last_contact': None})
+            rows.append(values + [extra])
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO sponsors ({', '.join(COLUMNS)}, extra) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+            return self.conn.total_changes - before
+
+    def upsert(self, sponsor):
+        values, extra = self.split(sponsor)
+        assignments = ', '.join(f"{column} = excluded.{column}" for column in COLUMNS[1:])
+        with self.lock:
+            self.conn.execute(f"""
+                INSERT INTO sponsors ({', '.join(COLUMNS)}, extra) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(email) DO UPDATE SET {assignments}, extra = excluded.extra
+            """, values + [extra])
+            self.conn.commit()
+
+    def get(self, email):
+        row = self.conn.execute("SELECT * FROM sponsors WHERE email = ?", (email,)).fetchone()
+        if row is None:
+            return None
+        return self.row_to_sponsor(row, self.responses(email))
+
+    def responses(self, email):
+        return [
+            {'date': date, 'response': response, 'analysis': json.loads(analysis) if analysis else None}
+            for date, response, analysis in self.conn.execute(
+                "SELECT date, response, analysis FROM sponsor_responses WHERE email = ? ORDER BY id",
+                (email,)
+            )
+        ]
+
+    def mark_contacted(self, email, campaign, when=None):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE sponsors SET status = 'contacted', last_contact = ?, campaign = ? WHERE email = ?",
+                ((when or datetime.now()).isoformat(), campaign, email)
+            )
+            self.conn.commit()
+
+    def add_response(self, email, response, analysis, status=None, when=None):
+        """Record a reply and optionally move the sponsor to a new status"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO sponsor_responses (email, date, response, analysis) VALUES (?, ?, ?, ?)",
+                (email, (when or datetime.now()).isoformat(), response, json.dumps(analysis))
+            )
+            if status:
+                self.conn.execute("UPDATE sponsors SET status = ? WHERE email = ?", (status, email))
+            self.conn.commit()
+
+    def due_for_contact(self, contacted_before, statuses=None, limit=None):
+        """Sponsors never contacted or last contacted before the cutoff"""
+        query = "SELECT * FROM sponsors WHERE (last_contact IS NULL OR last_contact < ?)"
+        params = [contacted_before.isoformat()]
+        if statuses:
+            query += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        query += " ORDER BY last_contact IS NOT NULL, last_contact"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [self.row_to_sponsor(row) for row in self.conn.execute(query, params)]
+
+    def with_status(self, status):
+        return [
+            self.row_to_sponsor(row)
+            for row in self.conn.execute("SELECT * FROM sponsors WHERE status = ?", (status,))
+        ]
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM sponsors").fetchone()[0]
+
+    def migrate_json(self, path):
+        """One-time import of the old sponsors.json, renamed afterwards"""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'r') as f:
+                sponsors = json.load(f)
+        except json.JSONDecodeError:
+            return 0
+
+        for sponsor in sponsors:
+            if not sponsor.get('email'):
+                continue
+            self.upsert(sponsor)
+            for response in sponsor.get('responses', []):
+                self.add_response(
+                    sponsor['email'], response.get('response'), response.get('analysis'),
+                    when=datetime.fromisoformat(response['date'])
+                )
+        os.replace(path, f"{path}.migrated")
+        print(f"Migrated {len(sponsors)} sponsors from {path}")
+        return len(sponsors)
@@ -0,0 +1,200 @@
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .fake_providers import start_server, sign_payload
+
+WEBHOOK_SECRET = 'whsec_benchmark'
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def summarize(name, ops, elapsed, errors=0, latencies=None):
+    result = {
+        'scenario': name,
+        'ops': ops,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'ops_per_s': round(ops / elapsed, 1) if elapsed else None
+    }
+    if latencies:
+        result['p50_ms'] = round(percentile(latencies, 50) * 1000, 2)
+        result['p99_ms'] = round(percentile(latencies, 99) * 1000, 2)
+    return result
+
+def timed_map(fn, items, concurrency):
+    """Run fn over items concurrently; returns (elapsed, errors, per-call latencies)"""
+    def call(item):
+        start = time.perf_counter()
+        ok = fn(item)
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, items))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for ok, _ in results if not ok)
+    return elapsed, errors, [latency for _, latency in results]
+
+def bench_purchases(modules, count, concurrency):
+    manager = modules['stripe_integration'].stripe_manager
+    def purchase(i):
+        intent = manager.create_payment_intent(
+            19.99, 'usd', metadata={'user_id': f"user_{i % 1000}"}
+        )
+        return intent is not None
+
+    elapsed, errors, latencies = timed_map(purchase, range(count), concurrency)
+    return summarize('purchases', count, elapsed, errors, latencies)
+
+def bench_webhooks(modules, count, concurrency):
+    manager = modules['stripe_integration'].stripe_manager
+    manager.start_webhook_workers()
+    queue = manager.webhook_queue
+
+    payloads = []
+    for i in range(count):
+        event = {
+            'id': f"evt_{uuid.uuid4().hex}",
+            'object': 'event',
+            'type': 'payment_intent.succeeded',
+            'created': int(time.time()),
+            'api_version': '2023-10-16',
+            'data': {'object': {
+                'id': f"pi_{uuid.uuid4().hex[:24]}",
+                'object': 'payment_intent',
+                'customer': f"cus_{i % 200}",
+                'amount': 1999,
+                'currency': 'usd',
+                'metadata': {'user_id': f"user_{i % 200}"}
+            }}
+        }
+        payload = json.dumps(event)
+        payloads.append((payload, sign_payload(payload, WEBHOOK_SECRET)))
+
+    elapsed, errors, latencies = timed_map(
+        lambda item: manager.handle_webhook(*item), payloads, concurrency
+    )
+    ingest = summarize('webhooks_ingest', count, elapsed, errors, latencies)
+
+    # Time until the worker pool has drained the queue
+    start = time.perf_counter()
+    while queue.pending_count():
+        time.sleep(0.01)
+    drain = summarize('webhooks_processed', count, elapsed + time.perf_counter() - start)
+    return [ingest, drain]
+
+def bench_payouts(modules, count):
+    router = modules['payout_router']
+    start = time.perf_counter()
+    for i in range(count):
+        router.route_payout(1000, 'USD', revenue_key=f"bench-{i}")
+    elapsed = time.perf_counter() - start
+
+    jobs = router.payout_jobs.conn.execute(
+        "SELECT state, COUNT(*) FROM payout_jobs GROUP BY state"
+    ).fetchall()
+    states = dict(jobs)
+    transfers = sum(states.values())
+    return summarize('payouts', transfers, elapsed, transfers - states.get('succeeded', 0))
+
+def bench_reconciliation(modules, state, count):
+    reconciliation = modules['reconciliation']
+    state.seed_payouts(count)
+    start = time.perf_counter()
+    reconciliation.reconcile_payouts()
+    return summarize('reconciliation', count, time.perf_counter() - start)
+
+def load_modules(base_url):
+    """Import the monetization modules against the fake providers"""
+    os.environ.update({
+        'STRIPE_KEY': 'sk_test_benchmark',
+        'STRIPE_ACCOUNT_ID': 'acct_benchmark',
+        'STRIPE_WEBHOOK_SECRET': WEBHOOK_SECRET,
+        'VALR_API': f"{base_url}/valr/v1",
+        'TRUST_API': f"{base_url}/trust/payments",
+        'PAYPAL_ID': 'acct_paypal_benchmark',
+        'PAYOUT_RETRY_WINDOW': '0'
+    })
+
+    import stripe
+    from monetization import stripe_integration, payout_router, reconciliation
+    stripe.api_base = base_url
+    return {
+        'stripe_integration': stripe_integration,
+        'payout_router': payout_router,
+        'reconciliation': reconciliation
+    }
+
+def run(args):
+    server, state = start_server(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        page_size=args.page_size
+    )
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # Every store and log file lands in a throwaway directory; keep the
+    # repository importable once we leave it
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    workdir = tempfile.mkdtemp(prefix='arenax-bench-')
+    os.chdir(workdir)
+    modules = load_modules(base_url)
+
+    scenarios = args.scenario.split(',') if args.scenario != 'all' else \
+        ['purchases', 'webhooks', 'payouts', 'reconciliation']
+
+    results = []
+    # Handlers print per operation; keep that out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for scenario in scenarios:
+            if scenario == 'purchases':
+                results.append(bench_purchases(modules, args.count, args.concurrency))
+            elif scenario == 'webhooks':
+                results.extend(bench_webhooks(modules, args.count, args.concurrency))
+            elif scenario == 'payouts':
+                results.append(bench_payouts(modules, max(1, args.count // 10)))
+            elif scenario == 'reconciliation':
+                results.append(bench_reconciliation(modules, state, args.count))
+
+    server.shutdown()
+    return {
+        'latency': args.latency,
+        'error_rate': args.error_rate,
+        'concurrency': args.concurrency,
+        'provider_requests': state.requests,
+        'provider_errors': state.errors,
+        'workdir': workdir,
+        'results': results
+    }
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m monetization.benchmark
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", default="all",
+                        help="Comma-separated: purchases, webhooks, payouts, reconciliation")
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", default="lognormal:3,0.5",
+                        help="Provider latency in ms: constant:x | uniform:a,b | lognormal:mu,sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,316 @@
+# Offline stand-in for Stripe, VALR and Trust Wallet used for benchmarks and
+# retry testing. Point the code at it with stripe.api_base = "http://127.0.0.1:12111",
+# VALR_API=http://127.0.0.1:12111/valr/v1 and TRUST_API=http://127.0.0.1:12111/trust/payments
+import hmac
+import json
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+class LatencyModel:
+    """Latency in milliseconds drawn from 'constant:x', 'uniform:a,b' or 'lognormal:mu,sigma'"""
+    def __init__(self, spec='constant:0'):
+        kind, _, args = spec.partition(':')
+        self.kind = kind
+        self.args = [float(a) for a in args.split(',') if a]
+        if kind not in ('constant', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self):
+        if self.kind == 'constant':
+            return self.args[0] if self.args else 0.0
+        if self.kind == 'uniform':
+            return random.uniform(*self.args)
+        return random.lognormvariate(*self.args)
+
+def parse_form(body):
+    """Decode Stripe's form encoding (metadata[bank]=x, items[0][price]=y) into nested dicts"""
+    result = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = key.replace(']', '').split('[')
+        target = result
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return result
+
+def sign_payload(payload, secret, timestamp=None):
+    """Build a Stripe-Signature header for a webhook payload"""
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+class FakeProviderState:
+    """Objects created through the fake APIs, kept in memory"""
+    def __init__(self, latency='constant:0', error_rate=0.0, webhook_url=None,
+                 webhook_secret='whsec_fake', page_size=100):
+        self.latency = LatencyModel(latency)
+        self.error_rate = error_rate
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.page_size = page_size
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.idempotent = {}
+        self.requests = 0
+        self.errors = 0
+        self.webhooks_sent = 0
+
+    def create(self, prefix, obj_type, fields):
+        with self.lock:
+            obj = {
+                'id': f"{prefix}_{uuid.uuid4().hex[:24]}",
+                'object': obj_type,
+                'created': int(time.time()),
+                'livemode': False,
+                'metadata': {},
+                **fields
+            }
+            self.objects.setdefault(obj_type, {})[obj['id']] = obj
+        return obj
+
+    def list(self, obj_type, params):
+        """Stripe-style page ordered newest first with starting_after and created filters"""
+        items = sorted(
+            self.objects.get(obj_type, {}).values(),
+            key=lambda o: (o['created'], o['id']),
+            reverse=True
+        )
+        created = params.get('created')
+        if isinstance(created, dict):
+            for op, value in created.items():
+                value = int(value)
+                check = {'gt': lambda c: c > value, 'gte': lambda c: c >= value,
+                         'lt': lambda c: c < value, 'lte': lambda c: c <= value}[op]
+                items = [o for o in items if check(o['created'])]
+        if params.get('status') and params['status'] != 'all':
+            items = [o for o in items if o.get('status') == params['status']]
+        types = params.get('types')
+        if isinstance(types, dict):
+            items = [o for o in items if o.get('type') in types.values()]
+
+        if params.get('starting_after'):
+            ids = [o['id'] for o in items]
+            if params['starting_after'] in ids:
+                items = items[ids.index(params['starting_after']) + 1:]
+
+        limit = min(int(params.get('limit', 10)), self.page_size)
+        return {
+            'object': 'list',
+            'url': f"/v1/{obj_type}s",
+            'data': items[:limit],
+            'has_more': len(items) > limit
+        }
+
+    def emit_event(self, event_type, obj):
+        """Record an event and deliver it to the webhook URL in the background"""
+        event = self.create('evt', 'event', {
+            'type': event_type,
+            'api_version': '2023-10-16',
+            'data': {'object': obj}
+        })
+        if self.webhook_url:
+            threading.Thread(target=self.deliver, args=(event,), daemon=True).start()
+        return event
+
+    def deliver(self, event):
+        payload = json.dumps(event)
+        request = urllib.request.Request(
+            self.webhook_url,
+            data=payload.encode(),
+            headers={
+                'Content-Type': 'application/json',
+                'Stripe-Signature': sign_payload(payload, self.webhook_secret)
+            }
+        )
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+            with self.lock:
+                self.webhooks_sent += 1
+        except OSError as e:
+            print(f"Webhook delivery failed: {e}")
+
+    def seed_payouts(self, count, days=1, failure_rate=0.05):
+        """Create historical payouts for reconciliation benchmarks"""
+        now = int(time.time())
+        for _ in range(count):
+            status = 'failed' if random.random() < failure_rate else random.choice(['paid', 'paid', 'in_transit'])
+            bank = random.random() < 0.5
+            payout = self.create('po', 'payout', {
+                'amount': random.randint(5000, 500000),
+                'currency': 'usd',
+                'status': status,
+                'destination': f"ba_{uuid.uuid4().hex[:16]}" if bank else f"acct_{uuid.uuid4().hex[:16]}",
+                'metadata': {'bank': 'FNB Global Account'} if bank else {}
+            })
+            payout['created'] = now - random.randint(0, days * 86400)
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.handle_call('GET')
+
+    def do_POST(self):
+        self.handle_call('POST')
+
+    def handle_call(self, method):
+        state = self.state
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        params = parse_form(url.query if method == 'GET' else body)
+        if method == 'POST' and body.startswith('{'):
+            params = json.loads(body)
+
+        with state.lock:
+            state.requests += 1
+        time.sleep(state.latency.sample() / 1000.0)
+
+        if random.random() < state.error_rate:
+            with state.lock:
+                state.errors += 1
+            return self.send_json(500, {'error': {'type': 'api_error', 'message': 'Injected failure'}})
+
+        # Replays of an idempotent request return the original response
+        key = self.headers.get('Idempotency-Key')
+        if method == 'POST' and key:
+            cached = state.idempotent.get(key)
+            if cached:
+                return self.send_json(*cached)
+
+        status, response = self.route(method, url.path, params)
+        if method == 'POST' and key and status == 200:
+            state.idempotent[key] = (status, response)
+        self.send_json(status, response)
+
+    def route(self, method, path, params):
+        state = self.state
+        parts = [p for p in path.split('/') if p]
+
+        if parts[:1] == ['valr']:
+            return 200, {'id': uuid.uuid4().hex, 'status': 'PROCESSING'}
+        if parts[:1] == ['trust']:
+            return 200, {'id': uuid.uuid4().hex, 'status': 'submitted'}
+        if parts[:1] != ['v1'] or len(parts) < 2:
+            return 404, {'error': {'type': 'invalid_request_error', 'message': f'Unknown path {path}'}}
+
+        resource = parts[1]
+        object_types = {
+            'payment_intents': ('pi', 'payment_intent'),
+            'setup_intents': ('seti', 'setup_intent'),
+            'customers': ('cus', 'customer'),
+            'products': ('prod', 'product'),
+            'prices': ('price', 'price'),
+            'subscriptions': ('sub', 'subscription'),
+            'transfers': ('tr', 'transfer'),
+            'payouts': ('po', 'payout'),
+            'refunds': ('re', 'refund'),
+            'events': ('evt', 'event')
+        }
+
+        if resource == 'accounts' and len(parts) >= 4 and parts[3] == 'external_accounts':
+            return 200, state.create('ba', 'bank_account', params.get('external_account', {}))
+        if resource not in object_types:
+            return 404, {'error': {'type': 'invalid_request_error', 'message': f'Unknown resource {resource}'}}
+
+        prefix, obj_type = object_types[resource]
+        if method == 'GET' and len(parts) == 2:
+            return 200, state.list(obj_type, params)
+        if method == 'GET':
+            obj = state.objects.get(obj_type, {}).get(parts[2])
+            if obj is None:
+                return 404, {'error': {'type': 'invalid_request_error', 'message': 'No such object'}}
+            return 200, obj
+
+        fields = dict(params)
+        fields.pop('expand', None)
+        for numeric in ('amount', 'unit_amount', 'trial_period_days'):
+            if numeric in fields:
+                fields[numeric] = int(fields[numeric])
+
+        if resource == 'payment_intents':
+            obj = state.create(prefix, obj_type, {'status': 'requires_payment_method', **fields})
+            # Simulate the customer completing the payment
+            succeeded = {**obj, 'status': 'succeeded'}
+            state.emit_event('payment_intent.succeeded', succeeded)
+            return 200, obj
+        if resource == 'subscriptions' and len(parts) == 2:
+            now = int(time.time())
+            obj = state.create(prefix, obj_type, {
+                'status': 'trialing',
+                'current_period_end': now + 30 * 86400,
+                'trial_end': now + 7 * 86400,
+                **fields
+            })
+            state.emit_event('customer.subscription.created', obj)
+            return 200, obj
+        if resource == 'subscriptions':
+            obj = state.objects.get(obj_type, {}).get(parts[2])
+            if obj is None:
+                return 404, {'error': {'type': 'invalid_request_error', 'message': 'No such subscription'}}
+            obj.update(fields)
+            state.emit_event('customer.subscription.updated', obj)
+            return 200, obj
+        if resource == 'transfers':
+            return 200, state.create(prefix, obj_type, {'status': 'paid', **fields})
+        if resource == 'payouts':
+            return 200, state.create(prefix, obj_type, {'status': 'pending', **fields})
+        return 200, state.create(prefix, obj_type, fields)
+
+def start_server(host='127.0.0.1', port=0, **options):
+    """Start the fake provider server in a background thread"""
+    state = FakeProviderState(**options)
+    handler = type('BoundFakeProviderHandler', (FakeProviderHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-providers', daemon=True).start()
+    return server, state
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", default="constant:0", help="constant:ms | uniform:a,b | lognormal:mu,sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--webhook-url", help="Deliver signed events to this URL")
+    parser.add_argument("--webhook-secret", default="whsec_fake")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--seed-payouts", type=int, default=0)
+    args = parser.parse_args()
+
+    server, state = start_server(
+        args.host, args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        webhook_url=args.webhook_url,
+        webhook_secret=args.webhook_secret,
+        page_size=args.page_size
+    )
+    state.seed_payouts(args.seed_payouts)
+    print(f"Fake providers listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,159 @@
+import os
+import gzip
+import json
+import time
+import atexit
+import shutil
+import threading
+from datetime import datetime
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+class LogWriter:
+    """Buffered JSON-lines writer with size-based rotation.
+
+    Records are kept in memory and written in one append when the buffer
+    reaches max_records, when flush_interval elapses, or at shutdown. The
+    fsync policy controls durability: 'always' syncs every flush, 'interval'
+    at most every fsync_interval seconds, 'never' leaves it to the OS.
+    """
+    def __init__(self, path, max_records=200, flush_interval=1.0, fsync='interval',
+                 fsync_interval=5.0, max_bytes=10 * 1024 * 1024, backups=5):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid fsync policy: {fsync}")
+        self.path = path
+        self.max_records = max_records
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.compress_lock = threading.Lock()
+        self.file = None
+        self.last_flush = time.monotonic()
+        self.last_fsync = time.monotonic()
+
+    def write(self, record):
+        """Queue a record; it is stamped with a timestamp if it has none"""
+        if 'timestamp' not in record:
+            record = {'timestamp': datetime.utcnow().isoformat(), **record}
+        line = json.dumps(record, default=str) + "\n"
+
+        with self.lock:
+            self.buffer.append(line)
+            if len(self.buffer) >= self.max_records:
+                self.flush_locked()
+
+    def flush(self, force_sync=False):
+        with self.lock:
+            self.flush_locked(force_sync)
+
+    def flush_if_due(self):
+        with self.lock:
+            if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush_locked()
+
+    def flush_locked(self, force_sync=False):
+        now = time.monotonic()
+        self.last_flush = now
+        if not self.buffer:
+            return
+
+        if self.file is None:
+            self.file = open(self.path, 'a')
+        self.file.write("".join(self.buffer))
+        self.buffer = []
+        self.file.flush()
+
+        if self.fsync == 'always' or force_sync or \
+           (self.fsync == 'interval' and now - self.last_fsync >= self.fsync_interval):
+            os.fsync(self.file.fileno())
+            self.last_fsync = now
+
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.rotate_locked()
+
+    def rotate_locked(self):
+        """Move the current file aside; compression happens off the writer lock"""
+        if self.fsync != 'never':
+            os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+
+        segment = f"{self.path}.{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}"
+        os.replace(self.path, segment)
+        # Not a daemon thread, so the interpreter finishes it before exiting
+        threading.Thread(target=self.compress_segment, args=(segment,), name="log-compress").start()
+
+    def compress_segment(self, segment):
+        """Gzip a rotated segment and prune old ones"""
+        with self.compress_lock:
+            try:
+                with open(segment, 'rb') as src, gzip.open(f"{segment}.gz", 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(segment)
+
+                directory = os.path.dirname(self.path) or '.'
+                prefix = os.path.basename(self.path) + '.'
+                segments = sorted(
+                    name for name in os.listdir(directory)
+                    if name.startswith(prefix) and name.endswith('.gz')
+                )
+                for name in segments[:-self.backups] if self.backups else segments:
+                    os.remove(os.path.join(directory, name))
+            except OSError as e:
+                print(f"Log compression failed for {segment}: {e}")
+
+    def close(self):
+        with self.lock:
+            self.flush_locked(force_sync=self.fsync != 'never')
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+def format_amount(amount):
+    """Money amounts are logged as fixed two-decimal strings in every log"""
+    return f"{amount:.2f}"
+
+# Shared writers, one per log file
+writers = {}
+writers_lock = threading.Lock()
+flusher = None
+
+def get_log_writer(path):
+    """Return the process-wide writer for a log file"""
+    global flusher
+    with writers_lock:
+        writer = writers.get(path)
+        if writer is None:
+            writer = LogWriter(
+                path,
+                max_records=int(os.getenv('LOG_BUFFER_RECORDS', '200')),
+                flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', '1.0')),
+                fsync=os.getenv('LOG_FSYNC_POLICY', 'interval'),
+                max_bytes=int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+                backups=int(os.getenv('LOG_BACKUPS', '5'))
+            )
+            writers[path] = writer
+
+        if flusher is None:
+            flusher = threading.Thread(target=flush_loop, name="log-flusher", daemon=True)
+            flusher.start()
+        return writer
+
+def flush_loop():
+    while True:
+        time.sleep(0.2)
+        for writer in list(writers.values()):
+            try:
+                writer.flush_if_due()
+            except OSError as e:
+                print(f"Log flush failed for {writer.path}: {e}")
+
+@atexit.register
+def close_all():
+    """Flush and close every writer at interpreter shutdown"""
+    for writer in list(writers.values()):
+        writer.close()
@@ -0,0 +1,127 @@
+import sqlite3
+import time
+from decimal import Decimal, ROUND_DOWN
+
+CENT = Decimal('0.01')
+DAY = 24 * 3600
+
+# Release a channel's balance once it reaches `threshold`, or once the oldest
+# unpaid share is `max_age_days` old, but never below the provider's hard
+# `min_amount` nor above `max_amount` in a single transfer
+CHANNEL_POLICIES = {
+    'valr': {'threshold': Decimal('25'), 'min_amount': Decimal('1'), 'max_amount': None, 'max_age_days': 7},
+    'trust_wallet': {'threshold': Decimal('25'), 'min_amount': Decimal('1'), 'max_amount': None, 'max_age_days': 7},
+    'paypal': {'threshold': Decimal('10'), 'min_amount': Decimal('1'), 'max_amount': None, 'max_age_days': 7},
+    # verify_fnb_transfer only accepts $50-$10,000
+    'fnb_bank': {'threshold': Decimal('100'), 'min_amount': Decimal('50'), 'max_amount': Decimal('10000'), 'max_age_days': 30}
+}
+
+class PayoutAccumulator:
+    """Durable per-channel owed balances that are netted into single transfers.
+
+    Amounts are stored as Decimal strings so accrual is exact. Every release
+    of a channel bumps its epoch, which gives each netted transfer a stable
+    identity: settle() only applies once per epoch.
+    """
+    def __init__(self, db_path, policies=None):
+        self.policies = policies or CHANNEL_POLICIES
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS channel_balances (
+                channel TEXT NOT NULL,
+                currency TEXT NOT NULL,
+                owed TEXT NOT NULL DEFAULT '0',
+                first_accrued_at REAL,
+                epoch INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (channel, currency)
+            );
+            CREATE TABLE IF NOT EXISTS accruals (
+                revenue_key TEXT PRIMARY KEY,
+                total TEXT NOT NULL,
+                currency TEXT NOT NULL,
+                recorded_at REAL NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def accrue(self, revenue_key, shares, currency):
+        """Add each channel's share of one revenue batch, at most once per key"""
+        now = time.time()
+        with self.conn:
+            inserted = self.conn.execute(
+                "INSERT OR IGNORE INTO accruals (revenue_key, total, currency, recorded_at) VALUES (?, ?, ?, ?)",
+                (revenue_key, str(sum(shares.values(), Decimal('0'))), currency, now)
+            ).rowcount
+            if not inserted:
+                return False
+
+            for channel, amount in shares.items():
+                row = self.conn.execute(
+                    "SELECT owed, first_accrued_at FROM channel_balances WHERE channel = ? AND currency = ?",
+                    (channel, currency)
+                ).fetchone()
+                owed = Decimal(row[0]) if row else Decimal('0')
+                first_accrued_at = row[1] if row and row[1] is not None else now
+                self.conn.execute(
+                    """INSERT INTO channel_balances (channel, currency, owed, first_accrued_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT(channel, currency) DO UPDATE SET
+                           owed = excluded.owed,
+                           first_accrued_at = excluded.first_accrued_at,
+                           updated_at = excluded.updated_at""",
+                    (channel, currency, str(owed + amount), first_accrued_at, now)
+                )
+        return True
+
+    def due(self, now=None):
+        """Channels ready for a transfer as (channel, currency, amount, epoch)"""
+        now = now or time.time()
+        releases = []
+        for channel, currency, owed, first_accrued_at, epoch in self.conn.execute(
+            "SELECT channel, currency, owed, first_accrued_at, epoch FROM channel_balances"
+        ):
+            policy = self.policies.get(channel)
+            if policy is None:
+                continue
+
+            amount = Decimal(owed).quantize(CENT, rounding=ROUND_DOWN)
+            if policy['max_amount'] is not None:
+                amount = min(amount, policy['max_amount'])
+            if amount < policy['min_amount']:
+                continue
+
+            aged = first_accrued_at is not None and \
+                now - first_accrued_at >= policy['max_age_days'] * DAY
+            if amount >= policy['threshold'] or aged:
+                releases.append((channel, currency, amount, epoch))
+        return releases
+
+    def settle(self, channel, currency, amount, epoch):
+        """Deduct a sent transfer; a repeated settle for the same epoch is a no-op"""
+        now = time.time()
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT owed, epoch FROM channel_balances WHERE channel = ? AND currency = ?",
+                (channel, currency)
+            ).fetchone()
+            if row is None or row[1] != epoch:
+                return False
+
+            remaining = Decimal(row[0]) - amount
+            self.conn.execute(
+                """UPDATE channel_balances
+                   SET owed = ?, epoch = epoch + 1, first_accrued_at = ?, updated_at = ?
+                   WHERE channel = ? AND currency = ?""",
+                (str(remaining), now if remaining > 0 else None, now, channel, currency)
+            )
+        return True
+
+    def balances(self):
+        return {
+            (channel, currency): Decimal(owed)
+            for channel, currency, owed in self.conn.execute(
+                "SELECT channel, currency, owed FROM channel_balances"
+            )
+        }
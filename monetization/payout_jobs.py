@@ -0,0 +1,172 @@
+import sqlite3
+import time
+import threading
+from decimal import Decimal
+
+class PayoutJobQueue:
+    """Durable queue of payout jobs with retries and crash recovery.
+
+    A job's id doubles as the idempotency key sent to the provider, so a job
+    that was interrupted mid-send can be resent safely. States move
+    pending -> running -> succeeded, or back to pending with exponential
+    backoff on failure until max_attempts is reached and the job is failed.
+    A job still sending when its run gives up on it, or left running by a
+    crashed run, moves to 'unknown' and is never claimed again until
+    resolve() settles it against the provider's records. A failed job
+    whose amount has been credited back to its channel becomes 'returned'.
+    """
+    def __init__(self, db_path, max_attempts=6, backoff_base=30, backoff_max=3600):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Late results of timed-out sends are recorded from worker threads
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS payout_jobs (
+                job_id TEXT PRIMARY KEY,
+                channel TEXT NOT NULL,
+                currency TEXT NOT NULL,
+                amount TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                result TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_payout_jobs_state
+                ON payout_jobs (state, next_attempt_at);
+        """)
+        self.conn.commit()
+
+    def enqueue(self, job_id, channel, currency, amount):
+        """Create a job unless one with this id exists; returns the stored job"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                """INSERT OR IGNORE INTO payout_jobs
+                       (job_id, channel, currency, amount, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (job_id, channel, currency, str(amount), now, now)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM payout_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['amount'] = Decimal(job['amount'])
+        return job
+
+    def recover(self):
+        """Park jobs left running by a crashed run; the send may have gone out"""
+        with self.lock, self.conn:
+            return self.conn.execute(
+                """UPDATE payout_jobs SET state = 'unknown', last_error = 'interrupted', updated_at = ?
+                   WHERE state = 'running'""",
+                (time.time(),)
+            ).rowcount
+
+    def claim_ready(self, now=None):
+        """Mark every due pending job as running and return them"""
+        now = now or time.time()
+        with self.lock, self.conn:
+            job_ids = [row[0] for row in self.conn.execute(
+                "SELECT job_id FROM payout_jobs WHERE state = 'pending' AND next_attempt_at <= ?",
+                (now,)
+            )]
+            for job_id in job_ids:
+                self.conn.execute(
+                    """UPDATE payout_jobs SET state = 'running', attempts = attempts + 1, updated_at = ?
+                       WHERE job_id = ?""",
+                    (now, job_id)
+                )
+        return [self.get(job_id) for job_id in job_ids]
+
+    def complete(self, job_id, result=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                """UPDATE payout_jobs SET state = 'succeeded', result = ?, last_error = NULL, updated_at = ?
+                   WHERE job_id = ?""",
+                (None if result is None else str(result), time.time(), job_id)
+            )
+
+    def fail(self, job_id, error):
+        """Schedule a retry with exponential backoff, or fail the job for good"""
+        with self.lock:
+            job = self.get(job_id)
+            now = time.time()
+            if job['attempts'] >= self.max_attempts:
+                state, next_attempt_at = 'failed', job['next_attempt_at']
+            else:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (job['attempts'] - 1))
+                state, next_attempt_at = 'pending', now + delay
+
+            with self.conn:
+                self.conn.execute(
+                    """UPDATE payout_jobs SET state = ?, next_attempt_at = ?, last_error = ?, updated_at = ?
+                       WHERE job_id = ?""",
+                    (state, next_attempt_at, error, now, job_id)
+                )
+        return state
+
+    def mark_unknown(self, job_id, error):
+        """Park a job whose send may still be in flight; it is not retried"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                """UPDATE payout_jobs SET state = 'unknown', last_error = ?, updated_at = ?
+                   WHERE job_id = ? AND state = 'running'""",
+                (error, time.time(), job_id)
+            )
+
+    def complete_late(self, job_id, result=None):
+        """Record that a send given up as unknown did succeed after all"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                """UPDATE payout_jobs SET state = 'succeeded', result = ?, last_error = NULL, updated_at = ?
+                   WHERE job_id = ? AND state = 'unknown'""",
+                (None if result is None else str(result), time.time(), job_id)
+            )
+
+    def resolve(self, job_id, sent):
+        """Settle an unknown job: succeeded if it was sent, otherwise ready to resend"""
+        if sent:
+            self.complete_late(job_id)
+            return
+        with self.lock, self.conn:
+            self.conn.execute(
+                """UPDATE payout_jobs SET state = 'pending', next_attempt_at = 0, updated_at = ?
+                   WHERE job_id = ? AND state = 'unknown'""",
+                (time.time(), job_id)
+            )
+
+    def mark_returned(self, job_id):
+        """Close a failed job once its amount is owed to the channel again"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE payout_jobs SET state = 'returned', updated_at = ? WHERE job_id = ? AND state = 'failed'",
+                (time.time(), job_id)
+            )
+
+    def next_retry_at(self):
+        """Earliest time a pending job becomes ready, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MIN(next_attempt_at) FROM payout_jobs WHERE state = 'pending'"
+            ).fetchone()
+        return row[0]
+
+    def unfinished(self):
+        with self.lock:
+            return [
+                dict(row) for row in self.conn.execute(
+                    """SELECT * FROM payout_jobs WHERE state IN ('pending', 'running', 'unknown', 'failed')
+                       ORDER BY created_at"""
+                )
+            ]
@@ -3,9 +3,23 @@ import requests
 import stripe
 import time
 import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
 from decimal import Decimal
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+try:
+    from .log_writer import get_log_writer, format_amount
+    from .payout_accumulator import PayoutAccumulator
+    from .payout_jobs import PayoutJobQueue
+except ImportError:  # Run as a script from the monetization directory
+    from log_writer import get_log_writer, format_amount
+    from payout_accumulator import PayoutAccumulator
+    from payout_jobs import PayoutJobQueue
+
 # Load environment variables
 load_dotenv()
 
@@ -14,15 +28,95 @@ stripe.api_key = os.getenv('STRIPE_KEY')
 stripe_account = os.getenv('STRIPE_ACCOUNT_ID')
 
 # Payment endpoints
-VALR_API = "https://api.valr.com/v1"
-TRUST_API = "https://api.trustwallet.com/payments"
+VALR_API = os.getenv('VALR_API', "https://api.valr.com/v1")
+TRUST_API = os.getenv('TRUST_API', "https://api.trustwallet.com/payments")
 FNB_SWIFT = "FIRNZAJJ"  # FNB South Africa SWIFT code
 
 # Global cache for external accounts
 external_accounts = {}
 
-def route_payout(total_amount, currency='USD'):
-    """Distribute revenue to multiple payment channels"""
+# Owed balances per channel, released as netted transfers that are
+# executed as durable jobs
+accumulator = PayoutAccumulator(os.getenv('PAYOUT_DB', 'payouts.db'))
+payout_jobs = PayoutJobQueue(os.getenv('PAYOUT_DB', 'payouts.db'))
+
+# Keep retrying failed jobs within a run while the next attempt is this close
+RETRY_WINDOW = int(os.getenv('PAYOUT_RETRY_WINDOW', '300'))
+
+# Per-channel limits: minimum spacing between calls and a hard deadline
+CHANNEL_LIMITS = {
+    'valr': {'min_interval': 2.0, 'deadline': 30.0},
+    'trust_wallet': {'min_interval': 2.0, 'deadline': 30.0},
+    'paypal': {'min_interval': 1.0, 'deadline': 30.0},
+    'fnb_bank': {'min_interval': 1.0, 'deadline': 60.0}
+}
+
+class ChannelLimiter:
+    """Enforce a minimum interval between calls to one payout channel"""
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.next_allowed = 0.0
+    
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_time = max(0.0, self.next_allowed - now)
+            self.next_allowed = max(now, self.next_allowed) + self.min_interval
+        if wait_time:
+            time.sleep(wait_time)
+
+limiters = {
+    channel: ChannelLimiter(limits['min_interval'])
+    for channel, limits in CHANNEL_LIMITS.items()
+}
+
+# Keep-alive HTTP sessions, one connection pool per provider
+sessions = {}
+
+def get_session(channel):
+    session = sessions.get(channel)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        sessions[channel] = session
+    return session
+
+def request_timeout(deadline):
+    """(connect, read) timeout that never runs past the channel deadline"""
+    remaining = max(1.0, deadline - time.monotonic())
+    return (min(5.0, remaining), remaining)
+
+def stripe_post(channel, url, params, deadline=None, idempotency_key=None):
+    """POST to Stripe with a timeout bounded by the payout's deadline.
+
+    Only payout sends use this; the process-wide default client, and every
+    other Stripe call, are left alone.
+    """
+    client = stripe.http_client.RequestsClient(
+        timeout=request_timeout(deadline) if deadline else 30,
+        session=get_session(channel)
+    )
+    requestor = stripe.api_requestor.APIRequestor(key=stripe.api_key, client=client, account=stripe_account)
+    headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+    response, api_key = requestor.request('post', url, params, headers)
+    return stripe.util.convert_to_stripe_object(response, api_key, None, stripe_account)
+
+def send_channel_payout(channel, amount, currency, idempotency_key=None):
+    """Rate-limit and send one channel's payout within its deadline"""
+    deadline = time.monotonic() + CHANNEL_LIMITS[channel]['deadline']
+    limiters[channel].acquire()
+    if channel == 'valr':
+        valr_payout(amount, currency, deadline, idempotency_key)
+    elif channel == 'trust_wallet':
+        trust_payout(amount, currency, deadline, idempotency_key)
+    elif channel == 'paypal':
+        paypal_payout(amount, currency, deadline, idempotency_key)
+    elif channel == 'fnb_bank':
+        fnb_payout(amount, currency, deadline, idempotency_key)
+
+def route_payout(total_amount, currency='USD', revenue_key=None):
+    """Accrue revenue shares per channel and send the channels that are due"""
     distribution = {
         'valr': Decimal('0.40'),
         'trust_wallet': Decimal('0.20'),
@@ -30,24 +124,144 @@ def route_payout(total_amount, currency='USD'):
         'fnb_bank': Decimal('0.20')
     }
     
-    # Process each payout
-    for channel, percentage in distribution.items():
-        amount = total_amount * percentage
-        if amount > 0.01:  # Minimum payout threshold
-            try:
-                if channel == 'valr':
-                    valr_payout(amount, currency)
-                elif channel == 'trust_wallet':
-                    trust_payout(amount, currency)
-                elif channel == 'paypal':
-                    paypal_payout(amount, currency)
-                elif channel == 'fnb_bank':
-                    fnb_payout(amount, currency)
-                time.sleep(2)  # Rate limiting
-            except Exception as e:
-                log_error(channel, str(e))
-
-def valr_payout(amount, currency):
+    # Each revenue batch (one per day by default) is credited only once
+    total_amount = Decimal(str(total_amount))
+    revenue_key = revenue_key or f"{datetime.utcnow().date().isoformat()}:{currency}"
+    shares = {channel: total_amount * percentage for channel, percentage in distribution.items()}
+    if not accumulator.accrue(revenue_key, shares, currency):
+        print(f"Revenue batch {revenue_key} already accrued")
+    
+    # Move each due balance into a job. The job id is fixed by the channel
+    # epoch, so after a crash the same job is found again and the balance
+    # is only deducted once. A job that fails for good is credited back
+    for channel, release_currency, amount, epoch in accumulator.due():
+        job = payout_jobs.enqueue(f"{channel}-{release_currency}-{epoch}", channel, release_currency, amount)
+        accumulator.settle(channel, release_currency, job['amount'], epoch)
+    
+    run_payout_jobs()
+
+def run_payout_jobs():
+    """Execute pending payout jobs, resolving any interrupted by a crash"""
+    interrupted = payout_jobs.recover()
+    if interrupted:
+        print(f"Checking {interrupted} interrupted payout jobs with their providers")
+    resolve_unknown_jobs()
+    
+    while True:
+        jobs = payout_jobs.claim_ready()
+        if jobs:
+            execute_jobs(jobs)
+            continue
+        
+        # Wait for a short backoff; anything longer is left for the next run
+        next_retry = payout_jobs.next_retry_at()
+        if next_retry is None or next_retry - time.time() > RETRY_WINDOW:
+            break
+        time.sleep(max(0, next_retry - time.time()))
+    
+    for job in payout_jobs.unfinished():
+        if job['state'] == 'failed':
+            # Nothing was sent, so the amount is owed again and goes out
+            # with the channel's next release
+            log_error(job['channel'], f"Job {job['job_id']} failed permanently: {job['last_error']}")
+            accumulator.accrue(f"returned:{job['job_id']}", {job['channel']: Decimal(job['amount'])}, job['currency'])
+            payout_jobs.mark_returned(job['job_id'])
+        elif job['state'] == 'unknown':
+            log_error(job['channel'], f"Job {job['job_id']} outcome unknown, check the provider before resending")
+
+def find_sent_payout(job):
+    """Provider id of the transfer a job already made, '' if none, None if it cannot be checked.
+
+    Stripe transfers and payouts carry the job id in their metadata. VALR
+    and Trust Wallet offer no lookup, so their jobs need manual review.
+    """
+    if job['channel'] == 'paypal':
+        resource = stripe.Transfer
+    elif job['channel'] == 'fnb_bank':
+        resource = stripe.Payout
+    else:
+        return None
+    
+    found = resource.list(
+        created={'gte': int(job['created_at']) - 60},
+        stripe_account=stripe_account,
+        limit=100
+    )
+    for item in found.auto_paging_iter():
+        if (item.metadata or {}).get('job_id') == job['job_id']:
+            return item.id
+    return ''
+
+def resolve_unknown_jobs():
+    """Settle jobs whose send may have happened before trusting a resend"""
+    for job in payout_jobs.unfinished():
+        if job['state'] != 'unknown':
+            continue
+        try:
+            sent = find_sent_payout(job)
+        except stripe.error.StripeError as e:
+            log_error(job['channel'], f"Could not check job {job['job_id']}: {e}")
+            continue
+        if sent:
+            payout_jobs.complete_late(job['job_id'], sent)
+        elif sent == '':
+            payout_jobs.resolve(job['job_id'], sent=False)
+
+def execute_jobs(jobs):
+    """Send claimed jobs concurrently, one worker per job"""
+    # One worker per job so a slow provider never delays the others
+    executor = ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="payout")
+    futures = {
+        executor.submit(send_channel_payout, job['channel'], job['amount'], job['currency'], job['job_id']): job
+        for job in jobs
+    }
+    
+    # Wall time is bounded by the slowest channel's deadline
+    max_deadline = max(CHANNEL_LIMITS[job['channel']]['deadline'] for job in jobs)
+    done, not_done = wait(futures, timeout=max_deadline + 5)
+    
+    for future in done:
+        job = futures[future]
+        try:
+            future.result()
+        except Exception as e:
+            log_error(job['channel'], str(e))
+            if outcome_unknown(e):
+                payout_jobs.mark_unknown(job['job_id'], str(e))
+            else:
+                payout_jobs.fail(job['job_id'], str(e))
+            continue
+        payout_jobs.complete(job['job_id'])
+    for future in not_done:
+        # The send may still land, so the job is never claimed again while
+        # it runs; a late success is recorded when the worker finishes
+        job = futures[future]
+        log_error(job['channel'], "Payout did not finish before its deadline; status unknown")
+        payout_jobs.mark_unknown(job['job_id'], "deadline exceeded")
+        future.add_done_callback(lambda f, job=job: record_late_result(job, f))
+    
+    executor.shutdown(wait=False)
+
+def outcome_unknown(error):
+    """True when a send error leaves open whether the provider acted on it"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return False
+    return isinstance(error, (
+        requests.exceptions.ReadTimeout,
+        requests.exceptions.ConnectionError,
+        stripe.error.APIConnectionError
+    ))
+
+def record_late_result(job, future):
+    """Settle a job given up as unknown once its send actually finishes"""
+    try:
+        future.result()
+    except Exception as e:
+        log_error(job['channel'], f"Job {job['job_id']} finished late with an error, needs review: {e}")
+        return
+    payout_jobs.complete_late(job['job_id'])
+
+def valr_payout(amount, currency, deadline=None, idempotency_key=None):
     """Send to VALR crypto exchange (South Africa)"""
     payload = {
         "type": "INSTANT",
@@ -55,19 +269,20 @@ def valr_payout(amount, currency):
         "amount": str(amount),
         "address": os.getenv('VALR_WALLET')
     }
-    response = requests.post(
+    response = get_session('valr').post(
         f"{VALR_API}/wallet/crypto/withdraw",
         json=payload,
         auth=(os.getenv('VALR_KEY'), os.getenv('VALR_SECRET')),
-        timeout=30
+        headers={"Idempotency-Key": idempotency_key} if idempotency_key else None,
+        timeout=request_timeout(deadline) if deadline else 30
     )
     if response.status_code != 200:
         raise Exception(f"VALR Error: {response.text}")
     log_transaction('VALR', amount, currency, response.status_code)
 
-def trust_payout(amount, currency):
+def trust_payout(amount, currency, deadline=None, idempotency_key=None):
     """Send to Trust Wallet (Crypto)"""
-    response = requests.post(
+    response = get_session('trust_wallet').post(
         TRUST_API,
         json={
             "asset": currency,
@@ -75,32 +290,34 @@ def trust_payout(amount, currency):
             "destination": os.getenv('TRUST_WALLET'),
             "memo": "ArenaX Revenue"
         },
-        headers={"Authorization": f"Bearer {os.getenv('TRUST_KEY')}"},
-        timeout=30
+        headers={
+            "Authorization": f"Bearer {os.getenv('TRUST_KEY')}",
+            **({"Idempotency-Key": idempotency_key} if idempotency_key else {})
+        },
+        timeout=request_timeout(deadline) if deadline else 30
     )
     if response.status_code != 200:
         raise Exception(f"Trust Wallet Error: {response.text}")
     log_transaction('Trust Wallet', amount, currency, response.status_code)
 
-def paypal_payout(amount, currency):
+def paypal_payout(amount, currency, deadline=None, idempotency_key=None):
     """Send to PayPal"""
-    transfer = stripe.Transfer.create(
-        amount=int(amount * 100),
-        currency=currency.lower(),
-        destination=os.getenv('PAYPAL_ID'),
-        description="ArenaX Revenue",
-        stripe_account=stripe_account
-    )
+    transfer = stripe_post('paypal', stripe.Transfer.class_url(), {
+        "amount": int(amount * 100),
+        "currency": currency.lower(),
+        "destination": os.getenv('PAYPAL_ID'),
+        "description": "ArenaX Revenue",
+        "metadata": {"job_id": idempotency_key} if idempotency_key else {}
+    }, deadline, idempotency_key)
     log_transaction('PayPal', amount, currency, transfer.status)
 
-def fnb_payout(amount, currency='USD'):
+def fnb_payout(amount, currency='USD', deadline=None, idempotency_key=None):
     """Send to FNB Global Account (USD) via SWIFT"""
     # Create or retrieve external account
     account_key = f"fnb_{currency}"
     if account_key not in external_accounts:
-        external_account = stripe.Account.create_external_account(
-            stripe_account,
-            external_account={
+        external_account = stripe_post('fnb_bank', f"{stripe.Account.class_url()}/{stripe_account}/external_accounts", {
+            "external_account": {
                 "object": "bank_account",
                 "country": "ZA",
                 "currency": currency,
@@ -109,23 +326,25 @@ def fnb_payout(amount, currency='USD'):
                 "account_holder_name": os.getenv('FNB_ACCOUNT_NAME'),
                 "account_holder_type": "company"
             }
-        )
+        }, deadline)
         external_accounts[account_key] = external_account.id
     
-    # Create payout
-    payout = stripe.Payout.create(
-        amount=int(amount * 100),
-        currency=currency,
-        destination=external_accounts[account_key],
-        description="ArenaX Revenue",
-        metadata={"bank": "FNB Global Account"},
-        stripe_account=stripe_account
-    )
+    params = {
+        "amount": int(amount * 100),
+        "currency": currency,
+        "destination": external_accounts[account_key],
+        "description": "ArenaX Revenue",
+        "metadata": {"bank": "FNB Global Account", **({"job_id": idempotency_key} if idempotency_key else {})}
+    }
     
-    # Verify compliance
-    if not verify_fnb_transfer(payout):
+    # Verify compliance before any money moves, so a rejected job is
+    # known not to have been sent
+    if not verify_fnb_transfer(stripe.Payout.construct_from(params, stripe.api_key)):
         raise Exception("FNB compliance check failed")
     
+    # Create payout
+    payout = stripe_post('fnb_bank', stripe.Payout.class_url(), params, deadline, idempotency_key)
+    
     log_transaction('FNB Global', amount, currency, payout.status)
 
 def verify_fnb_transfer(payout):
@@ -148,15 +367,31 @@ def verify_fnb_transfer(payout):
 def log_transaction(platform, amount, currency, status):
     print(f"[SUCCESS] Sent {amount:.2f} {currency} to {platform}. Status: {status}")
     # Add to audit log
-    with open("payout_audit.log", "a") as f:
-        f.write(f"{time.ctime()},{platform},{amount:.2f},{currency},{status}\n")
+    get_log_writer("payout_audit.log").write({
+        'event': 'payout',
+        'platform': platform,
+        'amount': format_amount(amount),
+        'currency': currency,
+        'status': status
+    })
 
 def log_error(channel, message):
     print(f"[ERROR] {channel} payout failed: {message}")
-    with open("payout_errors.log", "a") as f:
-        f.write(f"{time.ctime()},{channel},{message}\n")
+    get_log_writer("payout_errors.log").write({
+        'event': 'error',
+        'context': channel,
+        'message': message
+    })
 
 if __name__ == "__main__":
-    # Get total revenue from database
-    total_revenue = get_daily_revenue()  # Implement this function
-    route_payout(total_revenue, 'USD')
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resolve", metavar="JOB_ID", help="Settle a job left in the unknown state after checking the provider")
+    parser.add_argument("--sent", action="store_true", help="With --resolve: the provider shows the transfer was made")
+    args = parser.parse_args()
+    
+    if args.resolve:
+        payout_jobs.resolve(args.resolve, sent=args.sent)
+    else:
+        # Get total revenue from database
+        total_revenue = get_daily_revenue()  # Implement this function
+        route_payout(total_revenue, 'USD')
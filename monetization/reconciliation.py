@@ -1,50 +1,135 @@
 import stripe
 import os
-import csv
+import json
+import fcntl
+import argparse
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+try:
+    from .reconciliation_ledger import ReconciliationLedger
+except ImportError:  # Run as a script from the monetization directory
+    from reconciliation_ledger import ReconciliationLedger
+
 load_dotenv()
 stripe.api_key = os.getenv('STRIPE_KEY')
 stripe_account = os.getenv('STRIPE_ACCOUNT_ID')
 
+STATE_FILE = os.getenv('RECONCILIATION_STATE', 'reconciliation_state.json')
+FINAL_STATUSES = ('paid', 'failed', 'canceled')
+CHECKPOINT_EVERY = 100
+
+ledger = ReconciliationLedger(os.getenv('RECONCILIATION_DB', 'reconciliation.db'))
+
+def load_state():
+    """Load the reconciliation cursor and the set of unsettled payouts"""
+    try:
+        with open(STATE_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        # First run: start from the last 24 hours
+        yesterday = datetime.now() - timedelta(days=1)
+        return {
+            'cursor': {'created': int(yesterday.timestamp()), 'ids': []},
+            'pending': []
+        }
+
+def save_state(state):
+    """Commit buffered ledger rows, then write state atomically"""
+    # Ledger upserts are idempotent, so flushing first means a crash can at
+    # worst replay payouts after the previous checkpoint
+    ledger.flush()
+    tmp_path = f"{STATE_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_FILE)
+
 def reconcile_payouts():
-    """Verify completed payouts"""
-    # Get yesterday's date
-    yesterday = datetime.now() - timedelta(days=1)
-    start_date = int(yesterday.timestamp())
+    """Run one reconciliation pass unless another run holds the state lock.
+
+    The lock covers load to final save, so two overlapping runs never
+    start from the same cursor. Returns False if the pass was skipped.
+    """
+    with open(f"{STATE_FILE}.lock", 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("Reconciliation already running, skipping this run")
+            return False
+        try:
+            run_reconciliation()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return True
+
+def run_reconciliation():
+    """Verify payouts created since the last run and revisit unsettled ones"""
+    state = load_state()
+    cursor = state['cursor']
+    seen_at_cursor = set(cursor['ids'])
     
-    # Retrieve Stripe payouts
+    # Payouts that were still in flight last time
+    for payout_id in list(state['pending']):
+        payout = stripe.Payout.retrieve(payout_id, stripe_account=stripe_account)
+        reconcile_payout(payout, state)
+    save_state(state)
+    
+    # Only payouts newer than the cursor; the ids already handled in the
+    # cursor's second are skipped so ties are neither lost nor repeated
     payouts = stripe.Payout.list(
-        created={'gte': start_date},
+        created={'gte': cursor['created']},
         stripe_account=stripe_account,
         limit=100
     )
+    new_payouts = [
+        payout for payout in payouts.auto_paging_iter()
+        if payout.created > cursor['created'] or payout.id not in seen_at_cursor
+    ]
+    
+    # Oldest first, checkpointing the cursor every batch so a rerun
+    # resumes close to where this one stopped
+    new_payouts.sort(key=lambda payout: (payout.created, payout.id))
+    for count, payout in enumerate(new_payouts, 1):
+        reconcile_payout(payout, state)
+        if payout.created > cursor['created']:
+            cursor['created'] = payout.created
+            cursor['ids'] = []
+        cursor['ids'].append(payout.id)
+        if count % CHECKPOINT_EVERY == 0:
+            save_state(state)
+    save_state(state)
+
+def reconcile_payout(payout, state):
+    """Reconcile one payout and track it until it reaches a final status"""
+    destination = payout.destination or ''
+    if destination.startswith('ba_'):
+        reconcile_bank_payout(payout)
+    elif destination.startswith('acct_'):
+        reconcile_paypal_payout(payout)
     
-    # Process payouts
-    for payout in payouts.auto_paging_iter():
-        if payout.destination.startswith('ba_'):
-            reconcile_bank_payout(payout)
-        elif payout.destination.startswith('acct_'):
-            reconcile_paypal_payout(payout)
+    if payout.status in FINAL_STATUSES:
+        if payout.id in state['pending']:
+            state['pending'].remove(payout.id)
+    elif payout.id not in state['pending']:
+        state['pending'].append(payout.id)
 
 def reconcile_bank_payout(payout):
     """Reconcile FNB bank transfers"""
     if payout.metadata.get('bank') == "FNB Global Account":
         # Verify transaction details
         if payout.status == 'paid':
-            log_reconciliation(payout.id, 'FNB', 'success')
+            log_reconciliation(payout, 'FNB', 'success')
         elif payout.status == 'failed':
-            log_reconciliation(payout.id, 'FNB', 'failed')
+            log_reconciliation(payout, 'FNB', 'failed')
             # Trigger reprocessing
             reprocess_payout(payout)
 
 def reconcile_paypal_payout(payout):
     """Reconcile PayPal transfers"""
     if payout.status == 'paid':
-        log_reconciliation(payout.id, 'PayPal', 'success')
+        log_reconciliation(payout, 'PayPal', 'success')
     elif payout.status == 'failed':
-        log_reconciliation(payout.id, 'PayPal', 'failed')
+        log_reconciliation(payout, 'PayPal', 'failed')
         reprocess_payout(payout)
 
 def reprocess_payout(payout):
@@ -58,18 +143,41 @@ def reprocess_payout(payout):
             currency=currency,
             destination=os.getenv('PAYPAL_ID'),
             description="Reprocessed FNB Payout",
-            stripe_account=stripe_account
+            stripe_account=stripe_account,
+            # Never send the fallback twice for the same failed payout
+            idempotency_key=f"reprocess-{payout.id}"
         )
     else:
         # Retry original method
         # (Implement retry logic for other methods)
         pass
 
-def log_reconciliation(payout_id, platform, status):
-    print(f"Reconciled {payout_id} ({platform}): {status}")
-    with open("reconciliation_log.csv", "a") as f:
-        writer = csv.writer(f)
-        writer.writerow([datetime.now().isoformat(), payout_id, platform, status])
+def log_reconciliation(payout, platform, status):
+    print(f"Reconciled {payout.id} ({platform}): {status}")
+    ledger.record(
+        payout.id,
+        platform,
+        status,
+        amount=payout.amount,
+        currency=payout.currency,
+        created=payout.created
+    )
 
 if __name__ == "__main__":
-    reconcile_payouts()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--export-csv", help="Export the reconciliation ledger to a CSV file")
+    parser.add_argument("--platform", help="Filter the export by platform")
+    parser.add_argument("--status", help="Filter the export by status")
+    parser.add_argument("--since", help="Filter the export from this day (YYYY-MM-DD)")
+    args = parser.parse_args()
+    
+    if args.export_csv:
+        count = ledger.export_csv(
+            args.export_csv,
+            platform=args.platform,
+            status=args.status,
+            since=args.since
+        )
+        print(f"Exported {count} payouts to {args.export_csv}")
+    else:
+        reconcile_payouts()
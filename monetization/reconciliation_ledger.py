@@ -0,0 +1,139 @@
+import csv
+import sqlite3
+import uuid
+from datetime import datetime, timezone
+
+class ReconciliationLedger:
+    """Indexed SQLite ledger of reconciled payouts.
+
+    One row per payout holds its latest status; every distinct status a
+    payout passes through is kept once in payout_status_history. Writes are
+    buffered with record() and applied in a single transaction by flush().
+    """
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS payouts (
+                payout_id TEXT PRIMARY KEY,
+                platform TEXT NOT NULL,
+                status TEXT NOT NULL,
+                amount INTEGER,
+                currency TEXT,
+                created INTEGER,
+                day TEXT,
+                first_seen TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_payouts_platform_status_day
+                ON payouts (platform, status, day);
+            CREATE INDEX IF NOT EXISTS idx_payouts_status_day
+                ON payouts (status, day);
+            CREATE INDEX IF NOT EXISTS idx_payouts_day
+                ON payouts (day);
+
+            CREATE TABLE IF NOT EXISTS payout_status_history (
+                payout_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                recorded_at TEXT NOT NULL,
+                run_id TEXT NOT NULL,
+                UNIQUE (payout_id, status)
+            );
+        """)
+        self.conn.commit()
+        self.run_id = uuid.uuid4().hex
+        self.buffer = []
+
+    def record(self, payout_id, platform, status, amount=None, currency=None, created=None):
+        """Buffer a reconciliation result until the next flush"""
+        day = None
+        if created is not None:
+            day = datetime.fromtimestamp(created, tz=timezone.utc).strftime('%Y-%m-%d')
+        now = datetime.utcnow().isoformat()
+        self.buffer.append((payout_id, platform, status, amount, currency, created, day, now))
+
+    def flush(self):
+        """Upsert all buffered results in one transaction"""
+        if not self.buffer:
+            return 0
+
+        rows = self.buffer
+        with self.conn:
+            self.conn.executemany(
+                """INSERT INTO payouts
+                       (payout_id, platform, status, amount, currency, created, day, first_seen, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(payout_id) DO UPDATE SET
+                       platform = excluded.platform,
+                       status = excluded.status,
+                       amount = COALESCE(excluded.amount, payouts.amount),
+                       currency = COALESCE(excluded.currency, payouts.currency),
+                       created = COALESCE(excluded.created, payouts.created),
+                       day = COALESCE(excluded.day, payouts.day),
+                       updated_at = excluded.updated_at""",
+                [row + (row[-1],) for row in rows]
+            )
+            self.conn.executemany(
+                """INSERT OR IGNORE INTO payout_status_history
+                       (payout_id, status, recorded_at, run_id)
+                   VALUES (?, ?, ?, ?)""",
+                [(row[0], row[2], row[-1], self.run_id) for row in rows]
+            )
+        self.buffer = []
+        return len(rows)
+
+    def get(self, payout_id):
+        """Latest state of a payout with its status history"""
+        row = self.conn.execute(
+            "SELECT * FROM payouts WHERE payout_id = ?", (payout_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        payout = dict(row)
+        payout['history'] = [
+            dict(h) for h in self.conn.execute(
+                """SELECT status, recorded_at, run_id FROM payout_status_history
+                   WHERE payout_id = ? ORDER BY recorded_at""",
+                (payout_id,)
+            )
+        ]
+        return payout
+
+    def query(self, platform=None, status=None, since=None, until=None):
+        """Payouts filtered by platform, status and day range (YYYY-MM-DD, inclusive)"""
+        clauses, params = [], []
+        if platform:
+            clauses.append("platform = ?")
+            params.append(platform)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since:
+            clauses.append("day >= ?")
+            params.append(since)
+        if until:
+            clauses.append("day <= ?")
+            params.append(until)
+
+        sql = "SELECT * FROM payouts"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created"
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def export_csv(self, path, **filters):
+        """Write the (optionally filtered) ledger to a CSV file"""
+        rows = self.query(**filters)
+        columns = ['payout_id', 'platform', 'status', 'amount', 'currency',
+                   'created', 'day', 'first_seen', 'updated_at']
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
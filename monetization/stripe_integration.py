@@ -4,6 +4,9 @@ import json
 import time
 from datetime import datetime
 from dotenv import load_dotenv
+from .webhook_queue import WebhookQueue
+from .log_writer import get_log_writer, format_amount
+from .subscription_index import subscription_index, SUBSCRIPTION_EVENTS
 
 # Load environment variables
 load_dotenv()
@@ -12,10 +15,55 @@ load_dotenv()
 stripe.api_key = os.getenv('STRIPE_KEY')
 stripe_account = os.getenv('STRIPE_ACCOUNT_ID')
 
+class WebhookBatch:
+    """Collects balance and subscription changes from a batch of webhook events.
+
+    Each net balance remembers the events it came from, so once written the
+    (event, balance) pairs can be recorded and skipped if the batch is retried.
+    """
+    def __init__(self, applied=None):
+        self.balances = {}
+        self.sources = {}
+        self.subscriptions = {}
+        self.applied = applied or set()
+        self.event_id = None
+    
+    def add_balance(self, user_id, amount, currency):
+        key = (user_id, currency)
+        effect = f"balance:{user_id}:{currency}"
+        if (self.event_id, effect) in self.applied:
+            return
+        self.balances[key] = self.balances.get(key, 0) + amount
+        self.sources.setdefault(key, []).append((self.event_id, effect, amount))
+    
+    def discard_event(self):
+        """Back out the balance changes of the current event after it failed"""
+        for key, sources in self.sources.items():
+            for source in [s for s in sources if s[0] == self.event_id]:
+                self.balances[key] -= source[2]
+                sources.remove(source)
+    
+    def set_subscription(self, user_id, subscription_id, status, end_date=None):
+        # Later events for the same subscription supersede earlier ones
+        self.subscriptions[subscription_id] = (user_id, status, end_date)
+
 class StripeManager:
     def __init__(self):
         self.webhook_secret = os.getenv('STRIPE_WEBHOOK_SECRET')
         self.default_currency = 'usd'
+        self.webhook_queue = WebhookQueue(
+            os.getenv('WEBHOOK_QUEUE_DB', 'webhook_events.db'),
+            self.process_events,
+            workers=int(os.getenv('WEBHOOK_WORKERS', '4'))
+        )
+    
+    def start_webhook_workers(self):
+        """Start draining the webhook queue, including events left by a previous run.
+        
+        Call this from the startup of the process that serves webhooks;
+        importing this module never consumes the queue.
+        """
+        self.webhook_queue.start()
     
     def create_customer(self, user_id, email, name):
         """Create a new Stripe customer"""
@@ -62,32 +110,85 @@ class StripeManager:
             return None
     
     def handle_webhook(self, payload, sig_header):
-        """Process Stripe webhook events"""
+        """Verify a Stripe webhook and queue it for background processing"""
         try:
             event = stripe.Webhook.construct_event(
                 payload, sig_header, self.webhook_secret
             )
             
-            # Handle specific events
-            event_type = event['type']
-            if event_type == 'payment_intent.succeeded':
-                self.handle_payment_success(event)
-            elif event_type == 'invoice.payment_succeeded':
-                self.handle_subscription_payment(event)
-            elif event_type == 'customer.subscription.deleted':
-                self.handle_subscription_canceled(event)
-            elif event_type == 'charge.refunded':
-                self.handle_refund(event)
-            
+            # Acknowledge once the event is durably stored; Stripe retries
+            # of an event we already hold are ignored by the queue
+            self.webhook_queue.enqueue(event)
             return True
         except stripe.error.SignatureVerificationError as e:
             self.log_error('webhook_signature', str(e))
             return False
         except Exception as e:
-            self.log_error('webhook_processing', str(e))
+            self.log_error('webhook_enqueue', str(e))
             return False
     
-    def handle_payment_success(self, event):
+    def process_events(self, events):
+        """Process a batch of queued webhook events, in delivery order"""
+        batch = WebhookBatch(self.webhook_queue.applied_effects([event['id'] for event in events]))
+        failures = {}
+        failed_customers = set()
+        
+        for event in events:
+            obj = event['data']['object']
+            customer = obj.get('customer') or obj.get('id')
+            
+            # Keep per-customer ordering: once an event fails, hold back the
+            # customer's later events until it succeeds
+            if customer in failed_customers:
+                failures[event['id']] = WebhookQueue.DEFERRED
+                continue
+            
+            try:
+                batch.event_id = event['id']
+                self.process_event(event, batch)
+            except Exception as e:
+                self.log_error('webhook_processing', f"{event['id']}: {e}")
+                batch.discard_event()
+                failures[event['id']] = str(e)
+                failed_customers.add(customer)
+        
+        self.apply_batch(batch)
+        return failures
+    
+    def process_event(self, event, batch=None):
+        """Dispatch a single webhook event to its handler"""
+        event_type = event['type']
+        if event_type == 'payment_intent.succeeded':
+            self.handle_payment_success(event, batch)
+        elif event_type == 'invoice.payment_succeeded':
+            self.handle_subscription_payment(event, batch)
+        elif event_type == 'customer.subscription.deleted':
+            self.handle_subscription_canceled(event, batch)
+        elif event_type == 'charge.refunded':
+            self.handle_refund(event, batch)
+        
+        # Keep the local subscription index current
+        if event_type in SUBSCRIPTION_EVENTS:
+            subscription_index.apply_event(event)
+    
+    def apply_batch(self, batch):
+        """Write the net balance and latest subscription changes of a batch.
+
+        Each balance write is recorded as soon as it succeeds, so if a later
+        write raises and the batch is retried, finished writes are skipped.
+        """
+        for key, amount in batch.balances.items():
+            user_id, currency = key
+            if amount:
+                self.update_user_balance(user_id, amount, currency)
+            self.webhook_queue.mark_applied(
+                [(event_id, effect) for event_id, effect, _ in batch.sources[key]]
+            )
+        
+        for subscription_id, (user_id, status, end_date) in batch.subscriptions.items():
+            self.update_subscription_status(user_id, subscription_id, status, end_date)
+    
+    def handle_payment_success(self, event, batch=None):
         """Process successful payment"""
         payment_intent = event['data']['object']
         user_id = payment_intent['metadata'].get('user_id')
@@ -95,7 +196,10 @@ class StripeManager:
         currency = payment_intent['currency']
         
         # Update user's balance in database
-        self.update_user_balance(user_id, amount, currency)
+        if batch:
+            batch.add_balance(user_id, amount, currency)
+        else:
+            self.update_user_balance(user_id, amount, currency)
         
         # Log transaction
         self.log_transaction(
@@ -106,7 +210,7 @@ class StripeManager:
             user_id
         )
     
-    def handle_subscription_payment(self, event):
+    def handle_subscription_payment(self, event, batch=None):
         """Process subscription payment"""
         invoice = event['data']['object']
         subscription_id = invoice['subscription']
@@ -114,21 +218,29 @@ class StripeManager:
         amount = invoice['amount_paid'] / 100
         currency = invoice['currency']
         
-        # Get subscription details
-        subscription = stripe.Subscription.retrieve(
-            subscription_id,
-            stripe_account=stripe_account
-        )
+        # The invoice already carries the subscription metadata and billing
+        # period; only fall back to the API when it is missing
+        details = invoice.get('subscription_details') or {}
+        lines = (invoice.get('lines') or {}).get('data') or []
+        user_id = (details.get('metadata') or {}).get('user_id')
+        period_end = lines[0]['period']['end'] if lines else None
         
-        user_id = subscription['metadata'].get('user_id')
+        if not user_id or not period_end:
+            subscription = subscription_index.get(subscription_id)
+            if subscription is None:
+                subscription = stripe.Subscription.retrieve(
+                    subscription_id,
+                    stripe_account=stripe_account
+                )
+                subscription_index.upsert(subscription)
+            user_id = subscription['metadata'].get('user_id')
+            period_end = subscription['current_period_end']
         
         # Update user's subscription status
-        self.update_subscription_status(
-            user_id,
-            subscription_id,
-            'active',
-            subscription['current_period_end']
-        )
+        if batch:
+            batch.set_subscription(user_id, subscription_id, 'active', period_end)
+        else:
+            self.update_subscription_status(user_id, subscription_id, 'active', period_end)
         
         # Log transaction
         self.log_transaction(
@@ -139,19 +251,22 @@ class StripeManager:
             user_id
         )
     
-    def handle_subscription_canceled(self, event):
+    def handle_subscription_canceled(self, event, batch=None):
         """Process subscription cancellation"""
         subscription = event['data']['object']
         user_id = subscription['metadata'].get('user_id')
         
         # Update user's subscription status
-        self.update_subscription_status(
-            user_id,
-            subscription['id'],
-            'canceled'
-        )
+        if batch:
+            batch.set_subscription(user_id, subscription['id'], 'canceled')
+        else:
+            self.update_subscription_status(
+                user_id,
+                subscription['id'],
+                'canceled'
+            )
     
-    def handle_refund(self, event):
+    def handle_refund(self, event, batch=None):
         """Process refunds"""
         charge = event['data']['object']
         payment_intent = charge['payment_intent']
@@ -159,11 +274,14 @@ class StripeManager:
         currency = charge['currency']
         
         # Update user's balance
-        self.update_user_balance(
-            charge['metadata'].get('user_id'),
-            -amount,
-            currency
-        )
+        if batch:
+            batch.add_balance(charge['metadata'].get('user_id'), -amount, currency)
+        else:
+            self.update_user_balance(
+                charge['metadata'].get('user_id'),
+                -amount,
+                currency
+            )
     
     def update_user_balance(self, user_id, amount, currency):
         """Update user balance in database (stub implementation)"""
@@ -177,28 +295,22 @@ class StripeManager:
     
     def log_transaction(self, transaction_id, transaction_type, amount, currency, user_id):
         """Log transaction to database"""
-        timestamp = datetime.utcnow().isoformat()
-        data = {
+        get_log_writer("stripe_transactions.log").write({
+            'event': 'transaction',
             'transaction_id': transaction_id,
             'type': transaction_type,
-            'amount': amount,
+            'amount': format_amount(amount),
             'currency': currency,
-            'user_id': user_id,
-            'timestamp': timestamp
-        }
-        with open("stripe_transactions.log", "a") as f:
-            f.write(json.dumps(data) + "\n")
+            'user_id': user_id
+        })
     
     def log_error(self, context, message):
         """Log Stripe errors"""
-        timestamp = datetime.utcnow().isoformat()
-        error_data = {
+        get_log_writer("stripe_errors.log").write({
+            'event': 'error',
             'context': context,
-            'message': message,
-            'timestamp': timestamp
-        }
-        with open("stripe_errors.log", "a") as f:
-            f.write(json.dumps(error_data) + "\n")
+            'message': message
+        })
     
     def list_payment_methods(self, customer_id):
         """List customer's payment methods"""
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import stripe
+from dotenv import load_dotenv
+
+load_dotenv()
+stripe.api_key = os.getenv('STRIPE_KEY')
+stripe_account = os.getenv('STRIPE_ACCOUNT_ID')
+
+SUBSCRIPTION_EVENTS = (
+    'customer.subscription.created',
+    'customer.subscription.updated',
+    'customer.subscription.deleted',
+    'customer.subscription.paused',
+    'customer.subscription.resumed',
+    'customer.subscription.trial_will_end',
+)
+
+# Stripe only keeps events for 30 days; older checkpoints need a full rebuild
+EVENT_RETENTION = 29 * 24 * 3600
+
+class SubscriptionIndex:
+    """Local materialized view of Stripe subscriptions.
+
+    Records live in SQLite for durability and in two dicts (by subscription id
+    and by user id) so lookups never touch the Stripe API. The index is kept
+    current from webhook events and caught up with sync().
+    """
+    def __init__(self, db_path):
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                subscription_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                customer TEXT,
+                status TEXT,
+                version INTEGER NOT NULL DEFAULT 0,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_subscriptions_user
+                ON subscriptions (user_id);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self.conn.commit()
+
+        self.by_id = {}
+        self.by_user = {}
+        self.versions = {}
+        for sub_id, version, data in self.conn.execute(
+            "SELECT subscription_id, version, data FROM subscriptions"
+        ):
+            self.remember(json.loads(data), version)
+
+    def remember(self, record, version):
+        sub_id = record['id']
+        previous = self.by_id.get(sub_id)
+        if previous:
+            old_user = (previous.get('metadata') or {}).get('user_id')
+            self.by_user.get(old_user, set()).discard(sub_id)
+
+        self.by_id[sub_id] = record
+        self.versions[sub_id] = version
+        user_id = (record.get('metadata') or {}).get('user_id')
+        if user_id:
+            self.by_user.setdefault(user_id, set()).add(sub_id)
+
+    def upsert(self, subscription, version=None, commit=True):
+        """Store a subscription unless a newer version is already indexed.
+
+        An equal version overwrites, so of two events stamped with the same
+        second the one applied last wins.
+        """
+        record = json.loads(json.dumps(subscription))
+        version = version if version is not None else int(time.time())
+
+        with self.lock:
+            if self.versions.get(record['id'], -1) > version:
+                return False
+
+            self.conn.execute(
+                """INSERT INTO subscriptions (subscription_id, user_id, customer, status, version, data)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(subscription_id) DO UPDATE SET
+                       user_id = excluded.user_id,
+                       customer = excluded.customer,
+                       status = excluded.status,
+                       version = excluded.version,
+                       data = excluded.data""",
+                (record['id'], (record.get('metadata') or {}).get('user_id'),
+                 record.get('customer'), record.get('status'), version, json.dumps(record))
+            )
+            if commit:
+                self.conn.commit()
+            self.remember(record, version)
+        return True
+
+    def apply_event(self, event):
+        """Update the index from a customer.subscription.* webhook event"""
+        if event['type'] not in SUBSCRIPTION_EVENTS:
+            return False
+        return self.upsert(event['data']['object'], event['created'])
+
+    def as_object(self, record):
+        """Indexed records come back as StripeObjects, like API results"""
+        return stripe.Subscription.construct_from(record, stripe.api_key)
+
+    def get(self, subscription_id):
+        record = self.by_id.get(subscription_id)
+        return self.as_object(record) if record is not None else None
+
+    def list_for_user(self, user_id):
+        return [self.as_object(self.by_id[sub_id]) for sub_id in self.by_user.get(user_id, ())]
+
+    def ready(self):
+        """True once a full listing has completed and events keep it current"""
+        with self.lock:
+            return self.get_checkpoint('events_cursor') is not None
+
+    def get_checkpoint(self, key):
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_checkpoint(self, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+            (key, None if value is None else str(value))
+        )
+
+    def sync(self):
+        """Catch up from subscription events, rebuilding when the checkpoint is too old.
+
+        Events are fetched from the checkpoint second inclusive, since more
+        events stamped with that second can appear after it was stored; the
+        ids already applied at that second are skipped. Stripe lists newest
+        first, so events are applied in reverse to let the later of two
+        same-second events win.
+        """
+        cursor = self.get_checkpoint('events_cursor')
+        if cursor is None or time.time() - int(cursor) > EVENT_RETENTION:
+            self.rebuild()
+            cursor = self.get_checkpoint('events_cursor')
+
+        latest = int(cursor)
+        seen = set(json.loads(self.get_checkpoint('events_cursor_ids') or '[]'))
+        events = stripe.Event.list(
+            types=list(SUBSCRIPTION_EVENTS),
+            created={'gte': latest},
+            stripe_account=stripe_account,
+            limit=100
+        )
+        fresh = [
+            event for event in events.auto_paging_iter()
+            if not (event['created'] == latest and event['id'] in seen)
+        ]
+
+        with self.lock:
+            for event in reversed(fresh):
+                self.apply_event(event)
+                if event['created'] > latest:
+                    latest = event['created']
+                    seen = set()
+                if event['created'] == latest:
+                    seen.add(event['id'])
+            self.set_checkpoint('events_cursor', latest)
+            self.set_checkpoint('events_cursor_ids', json.dumps(sorted(seen)))
+            self.conn.commit()
+
+    def rebuild(self):
+        """Full listing of every subscription, resumable from the last page stored"""
+        started = self.get_checkpoint('rebuild_started') or str(int(time.time()))
+        starting_after = self.get_checkpoint('rebuild_after')
+
+        with self.lock:
+            self.set_checkpoint('rebuild_started', started)
+            self.conn.commit()
+
+            while True:
+                params = {'status': 'all', 'limit': 100, 'stripe_account': stripe_account}
+                if starting_after:
+                    params['starting_after'] = starting_after
+                page = stripe.Subscription.list(**params)
+
+                for subscription in page.data:
+                    # Listing is a snapshot older than any event after it starts
+                    self.upsert(subscription, int(started), commit=False)
+                if page.data:
+                    starting_after = page.data[-1].id
+                    self.set_checkpoint('rebuild_after', starting_after)
+                self.conn.commit()
+
+                if not page.has_more:
+                    break
+
+            # Events from when the listing began cover anything it missed
+            self.set_checkpoint('events_cursor', started)
+            self.set_checkpoint('events_cursor_ids', None)
+            self.set_checkpoint('rebuild_started', None)
+            self.set_checkpoint('rebuild_after', None)
+            self.conn.commit()
+
+# Shared index for the Stripe and subscription managers
+subscription_index = SubscriptionIndex(os.getenv('SUBSCRIPTION_INDEX_DB', 'subscriptions.db'))
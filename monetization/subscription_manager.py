@@ -1,9 +1,12 @@
 import stripe
 import os
 import time
+import threading
 from datetime import datetime
 from dotenv import load_dotenv
 from .stripe_integration import stripe_manager
+from .log_writer import get_log_writer
+from .subscription_index import subscription_index
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +18,9 @@ class SubscriptionManager:
     def __init__(self):
         self.default_currency = 'usd'
         self.trial_period_days = 7
+        self.sync_interval = float(os.getenv('SUBSCRIPTION_SYNC_INTERVAL', '300'))
+        self.sync_thread = None
+        self.sync_lock = threading.Lock()
     
     def create_subscription_plan(self, name, price, interval="month", currency=None):
         """Create a new subscription plan"""
@@ -64,6 +70,7 @@ class SubscriptionManager:
                 expand=['latest_invoice.payment_intent'],
                 stripe_account=stripe_account
             )
+            subscription_index.upsert(subscription)
             
             # Update user subscription status in database
             self.update_user_subscription(
@@ -86,6 +93,7 @@ class SubscriptionManager:
                 cancel_at_period_end=True,
                 stripe_account=stripe_account
             )
+            subscription_index.upsert(subscription)
             
             # Get user ID from metadata
             user_id = subscription.metadata.get('user_id')
@@ -112,6 +120,7 @@ class SubscriptionManager:
                 cancel_at_period_end=False,
                 stripe_account=stripe_account
             )
+            subscription_index.upsert(subscription)
             
             # Get user ID from metadata
             user_id = subscription.metadata.get('user_id')
@@ -147,6 +156,7 @@ class SubscriptionManager:
                 }],
                 stripe_account=stripe_account
             )
+            subscription_index.upsert(updated)
             
             # Get user ID from metadata
             user_id = subscription.metadata.get('user_id')
@@ -166,18 +176,31 @@ class SubscriptionManager:
             return None
     
     def get_subscription(self, subscription_id):
-        """Retrieve subscription details"""
+        """Retrieve subscription details from the local index"""
+        self.start_index_sync()
+        subscription = subscription_index.get(subscription_id)
+        if subscription is not None:
+            return subscription
+        
+        # Not indexed yet (e.g. created before the index existed)
         try:
-            return stripe.Subscription.retrieve(
+            subscription = stripe.Subscription.retrieve(
                 subscription_id,
                 stripe_account=stripe_account
             )
+            subscription_index.upsert(subscription)
+            return subscription
         except stripe.error.StripeError as e:
             self.log_error('get_subscription', str(e))
             return None
     
     def list_user_subscriptions(self, user_id):
-        """List all subscriptions for a user"""
+        """List all subscriptions for a user from the local index"""
+        self.start_index_sync()
+        if subscription_index.ready():
+            return subscription_index.list_for_user(user_id)
+        
+        # Until the first rebuild finishes the index may miss older subscriptions
         try:
             subscriptions = stripe.Subscription.list(
                 stripe_account=stripe_account,
@@ -186,16 +209,43 @@ class SubscriptionManager:
             )
             
             # Filter by user ID in metadata
-            user_subs = [
+            return [
                 sub for sub in subscriptions.auto_paging_iter()
                 if sub.metadata.get('user_id') == user_id
             ]
-            
-            return user_subs
         except stripe.error.StripeError as e:
             self.log_error('list_subscriptions', str(e))
             return []
     
+    def sync_subscription_index(self):
+        """Catch the local index up with Stripe (run periodically)"""
+        try:
+            subscription_index.sync()
+            return True
+        except stripe.error.StripeError as e:
+            self.log_error('sync_subscription_index', str(e))
+            return False
+    
+    def start_index_sync(self):
+        """Sync the index now and every sync_interval seconds in a background thread.
+        
+        Started by the first subscription lookup, so only processes that
+        serve lookups keep the index current.
+        """
+        with self.sync_lock:
+            if self.sync_thread is not None:
+                return
+            self.sync_thread = threading.Thread(target=self.sync_loop, name="subscription-sync", daemon=True)
+            self.sync_thread.start()
+    
+    def sync_loop(self):
+        while True:
+            try:
+                self.sync_subscription_index()
+            except Exception as e:
+                self.log_error('sync_subscription_index', str(e))
+            time.sleep(self.sync_interval)
+    
     def update_user_subscription(self, user_id, subscription_id, status, end_date=None):
         """Update subscription status in database (stub implementation)"""
         print(f"Updating subscription {subscription_id} for user {user_id}: {status}")
@@ -242,14 +292,11 @@ class SubscriptionManager:
     
     def log_error(self, context, message):
         """Log subscription errors"""
-        timestamp = datetime.utcnow().isoformat()
-        error_data = {
+        get_log_writer("subscription_errors.log").write({
+            'event': 'error',
             'context': context,
-            'message': message,
-            'timestamp': timestamp
-        }
-        with open("subscription_errors.log", "a") as f:
-            f.write(json.dumps(error_data) + "\n")
+            'message': message
+        })
     
     def apply_coupon(self, subscription_id, coupon_id):
         """Apply coupon to a subscription"""
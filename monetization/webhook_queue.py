@@ -0,0 +1,265 @@
+import json
+import time
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+class WebhookQueue:
+    """Durable SQLite-backed queue of verified Stripe events.
+
+    Events are deduplicated by event id on insert. Each customer hashes to a
+    single worker shard, so events for one customer are processed in the
+    order Stripe delivered them while different customers run in parallel.
+
+    The handler receives a batch of events and returns a dict mapping the ids
+    of events that failed to an error message. Events mapped to DEFERRED are
+    left pending without spending a retry attempt.
+
+    An event that exhausts max_attempts is marked 'failed' and every later
+    event for the same customer is parked as 'blocked' until retry_failed()
+    releases them, so ordering holds even across permanent failures.
+
+    Workers claim a batch by moving it to 'processing' with a lease in one
+    write transaction, so several processes can share the database without
+    handling an event twice. A claim whose lease runs out (its process died)
+    goes back to 'pending'. Nothing is consumed until start() is called.
+    """
+    DEFERRED = 'deferred'
+
+    def __init__(self, db_path, handler, workers=4, batch_size=50,
+                 max_attempts=5, poll_interval=1.0, lease_seconds=300):
+        self.db_path = db_path
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.wakeups = [threading.Event() for _ in range(workers)]
+        self.threads = []
+        self.running = False
+        self.local = threading.local()
+        self.init_db()
+
+    def connect(self):
+        """One connection per thread; SQLite connections are not shareable"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def init_db(self):
+        conn = self.connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS webhook_events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_id TEXT UNIQUE NOT NULL,
+                event_type TEXT NOT NULL,
+                customer TEXT,
+                shard INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                lease_until REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                received_at TEXT NOT NULL,
+                processed_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_webhook_pending
+                ON webhook_events (shard, status, seq);
+            CREATE INDEX IF NOT EXISTS idx_webhook_customer
+                ON webhook_events (customer, status);
+            CREATE TABLE IF NOT EXISTS webhook_effects (
+                event_id TEXT NOT NULL,
+                effect TEXT NOT NULL,
+                applied_at TEXT NOT NULL,
+                PRIMARY KEY (event_id, effect)
+            );
+        """)
+        conn.commit()
+
+    def shard_for(self, customer):
+        if not customer:
+            return 0
+        return zlib.crc32(customer.encode()) % self.workers
+
+    def enqueue(self, event):
+        """Persist an event; returns False if it was already received"""
+        obj = event['data']['object']
+        customer = obj.get('customer') or obj.get('id')
+        shard = self.shard_for(customer)
+
+        conn = self.connect()
+        with conn:
+            # Customers held behind a failed event queue up behind it
+            cursor = conn.execute(
+                """INSERT OR IGNORE INTO webhook_events
+                   (event_id, event_type, customer, shard, payload, received_at, status)
+                   VALUES (?, ?, ?, ?, ?, ?, CASE WHEN EXISTS (
+                       SELECT 1 FROM webhook_events
+                       WHERE customer = ? AND status IN ('failed', 'blocked')
+                   ) THEN 'blocked' ELSE 'pending' END)""",
+                (event['id'], event['type'], customer, shard,
+                 json.dumps(event), datetime.utcnow().isoformat(), customer)
+            )
+        self.wakeups[shard].set()
+        return cursor.rowcount == 1
+
+    def start(self):
+        """Start one worker thread per shard"""
+        if self.running:
+            return
+        self.running = True
+        for shard in range(self.workers):
+            thread = threading.Thread(
+                target=self.worker_loop,
+                args=(shard,),
+                name=f"webhook-worker-{shard}",
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=10):
+        self.running = False
+        for wakeup in self.wakeups:
+            wakeup.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def worker_loop(self, shard):
+        while self.running:
+            processed = self.process_shard(shard)
+            if not processed:
+                self.wakeups[shard].wait(self.poll_interval)
+                self.wakeups[shard].clear()
+
+    def claim(self, shard, now):
+        """Lease the next ready events of a shard; returns (seq, customer, event, attempts)"""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                """UPDATE webhook_events SET status = 'pending'
+                   WHERE shard = ? AND status = 'processing' AND lease_until < ?""",
+                (shard, now)
+            )
+            rows = conn.execute(
+                """SELECT seq, customer, payload, attempts, next_attempt_at, status FROM webhook_events
+                   WHERE shard = ? AND status IN ('pending', 'processing')
+                   ORDER BY seq LIMIT ?""",
+                (shard, self.batch_size)
+            ).fetchall()
+
+            # A customer whose oldest event is still backing off, or held by
+            # another process, is skipped entirely so its later events never
+            # overtake that one
+            waiting = set()
+            ready = []
+            for seq, customer, payload, attempts, next_attempt_at, status in rows:
+                if customer in waiting or status == 'processing' or next_attempt_at > now:
+                    waiting.add(customer)
+                    continue
+                ready.append((seq, customer, json.loads(payload), attempts))
+            conn.executemany(
+                "UPDATE webhook_events SET status = 'processing', lease_until = ? WHERE seq = ?",
+                [(now + self.lease_seconds, seq) for seq, _, _, _ in ready]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return ready
+
+    def process_shard(self, shard):
+        """Process the next batch for a shard; returns the number of events handled"""
+        conn = self.connect()
+        now = time.time()
+        ready = self.claim(shard, now)
+        if not ready:
+            return 0
+
+        try:
+            failures = self.handler([event for _, _, event, _ in ready]) or {}
+        except Exception as e:
+            failures = {event['id']: str(e) for _, _, event, _ in ready}
+
+        processed_at = datetime.utcnow().isoformat()
+        handled = 0
+        with conn:
+            for seq, customer, event, attempts in ready:
+                error = failures.get(event['id'])
+                if error is None:
+                    conn.execute(
+                        "UPDATE webhook_events SET status = 'done', processed_at = ? WHERE seq = ?",
+                        (processed_at, seq)
+                    )
+                    handled += 1
+                    continue
+                if error == self.DEFERRED:
+                    conn.execute("UPDATE webhook_events SET status = 'pending' WHERE seq = ?", (seq,))
+                    continue
+
+                handled += 1
+                attempts += 1
+                status = 'failed' if attempts >= self.max_attempts else 'pending'
+                conn.execute(
+                    """UPDATE webhook_events
+                       SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+                       WHERE seq = ?""",
+                    (status, attempts, now + 2 ** attempts, error, seq)
+                )
+                if status == 'failed':
+                    conn.execute(
+                        """UPDATE webhook_events SET status = 'blocked'
+                           WHERE customer = ? AND status = 'pending' AND seq > ?""",
+                        (customer, seq)
+                    )
+        return handled
+
+    def retry_failed(self, customer=None):
+        """Put failed events and the events blocked behind them back in the queue"""
+        conn = self.connect()
+        query = """UPDATE webhook_events SET status = 'pending', attempts = 0, next_attempt_at = 0
+                   WHERE status IN ('failed', 'blocked')"""
+        params = ()
+        if customer:
+            query += " AND customer = ?"
+            params = (customer,)
+        with conn:
+            released = conn.execute(query, params).rowcount
+        for wakeup in self.wakeups:
+            wakeup.set()
+        return released
+
+    def applied_effects(self, event_ids):
+        """(event_id, effect) pairs already written by an earlier attempt"""
+        if not event_ids:
+            return set()
+        placeholders = ', '.join('?' for _ in event_ids)
+        return set(self.connect().execute(
+            f"SELECT event_id, effect FROM webhook_effects WHERE event_id IN ({placeholders})",
+            list(event_ids)
+        ).fetchall())
+
+    def mark_applied(self, pairs):
+        """Record side effects as written so a retried batch skips them"""
+        conn = self.connect()
+        applied_at = datetime.utcnow().isoformat()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO webhook_effects (event_id, effect, applied_at) VALUES (?, ?, ?)",
+                [(event_id, effect, applied_at) for event_id, effect in pairs]
+            )
+
+    def pending_count(self):
+        """Events not yet handled, including those claimed right now"""
+        return self.connect().execute(
+            "SELECT COUNT(*) FROM webhook_events WHERE status IN ('pending', 'processing')"
+        ).fetchone()[0]
@@ -1,4 +1,9 @@
+import os
+import sys
+import json
+import argparse
 import numpy as np
+from multiprocessing import Pool
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
@@ -8,48 +13,138 @@ from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.models import save_model
 import joblib
 
+# Synthetic data generation is numpy-only and shared with fraud_benchmark.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'ai_agents'))
+from fraud_synthetic import generate_chunk
+from fraud_runtime import quantize_weights
+
+FEATURE_COLUMNS = [
+    'amount',
+    'time_of_day',
+    'day_of_week',
+    'merchant_category',
+    'customer_history',
+    'device_type',
+    'location_mismatch',
+    'ip_risk_score'
+]
+
 # Generate synthetic fraud dataset
 def generate_fraud_data(num_samples=10000):
-    np.random.seed(42)
-    
-    # Features: transaction amount, time, location, frequency, etc.
-    data = {
-        'amount': np.random.exponential(100, num_samples),
-        'time_of_day': np.random.randint(0, 24, num_samples),
-        'day_of_week': np.random.randint(0, 7, num_samples),
-        'merchant_category': np.random.randint(0, 10, num_samples),
-        'customer_history': np.random.poisson(5, num_samples),
-        'device_type': np.random.choice([0, 1, 2], num_samples),
-        'location_mismatch': np.random.choice([0, 1], num_samples, p=[0.7, 0.3]),
-        'ip_risk_score': np.random.beta(0.5, 0.5, num_samples)
-    }
-    
-    df = pd.DataFrame(data)
-    
-    # Fraud rules (synthetic patterns)
-    fraud_conditions = (
-        (df['amount'] > 500) & 
-        (df['location_mismatch'] == 1) &
-        (df['ip_risk_score'] > 0.8)
-    ) | (
-        (df['amount'] > 300) & 
-        (df['time_of_day'] < 6) & 
-        (df['merchant_category'] == 3)
-    ) | (
-        (df['customer_history'] < 2) & 
-        (df['amount'] > 700)
-    )
+    return pd.DataFrame(generate_chunk(42, num_samples))
+
+def write_chunk(task):
+    """Worker: generate rows [start, stop) straight into the column files"""
+    data_dir, start, stop, seed = task
+    data = generate_chunk(seed, stop - start)
+    for name, values in data.items():
+        column = np.load(os.path.join(data_dir, f'{name}.npy'), mmap_mode='r+')
+        column[start:stop] = values
+        column.flush()
+        del column
+    return stop - start
+
+def write_fraud_dataset(data_dir, num_samples, chunk_size=1_000_000, workers=None, seed=42):
+    """Generate a dataset larger than memory as memory-mapped .npy columns"""
+    os.makedirs(data_dir, exist_ok=True)
+    for name in FEATURE_COLUMNS:
+        np.lib.format.open_memmap(
+            os.path.join(data_dir, f'{name}.npy'), mode='w+', dtype=np.float32, shape=(num_samples,)
+        ).flush()
+    np.lib.format.open_memmap(
+        os.path.join(data_dir, 'is_fraud.npy'), mode='w+', dtype=np.int8, shape=(num_samples,)
+    ).flush()
     
-    df['is_fraud'] = fraud_conditions.astype(int)
+    tasks = [
+        (data_dir, start, min(start + chunk_size, num_samples), seed + i)
+        for i, start in enumerate(range(0, num_samples, chunk_size))
+    ]
+    written = 0
+    with Pool(workers) as pool:
+        for rows in pool.imap_unordered(write_chunk, tasks):
+            written += rows
+            print(f"Generated {written}/{num_samples} rows")
     
-    # Add noise
-    fraud_indices = df[df['is_fraud'] == 1].index
-    df.loc[fraud_indices[:len(fraud_indices)//3], 'is_fraud'] = 0
+    with open(os.path.join(data_dir, 'meta.json'), 'w') as f:
+        json.dump({'num_samples': num_samples, 'columns': FEATURE_COLUMNS, 'chunk_size': chunk_size}, f)
+    return data_dir
+
+def open_fraud_dataset(data_dir):
+    """Memory-map the feature columns and labels without reading them"""
+    columns = [np.load(os.path.join(data_dir, f'{name}.npy'), mmap_mode='r') for name in FEATURE_COLUMNS]
+    labels = np.load(os.path.join(data_dir, 'is_fraud.npy'), mmap_mode='r')
+    return columns, labels
+
+def read_block(columns, labels, start, stop):
+    features = np.column_stack([column[start:stop] for column in columns]).astype(np.float64)
+    return features, np.asarray(labels[start:stop], dtype=np.float32)
+
+def fit_streaming_scaler(columns, labels, stop, block_size=1_000_000):
+    """Fit a StandardScaler in one pass over rows [0, stop)"""
+    scaler = StandardScaler()
+    for start in range(0, stop, block_size):
+        features, _ = read_block(columns, labels, start, min(start + block_size, stop))
+        scaler.partial_fit(features)
+    return scaler
+
+def stream_batches(columns, labels, scaler, start, stop, batch_size=1024,
+                   block_size=262_144, shuffle=True, seed=0):
+    """Yield scaled (X, y) batches forever, reading one block at a time.
     
-    non_fraud_indices = df[df['is_fraud'] == 0].index
-    df.loc[non_fraud_indices[:200], 'is_fraud'] = 1
+    Shuffles block order and rows within each block, so reads stay
+    sequential and memory is bounded by block_size.
+    """
+    rng = np.random.RandomState(seed)
+    blocks = list(range(start, stop, block_size))
+    while True:
+        if shuffle:
+            rng.shuffle(blocks)
+        for block_start in blocks:
+            features, targets = read_block(columns, labels, block_start, min(block_start + block_size, stop))
+            features = scaler.transform(features)
+            order = rng.permutation(len(targets)) if shuffle else np.arange(len(targets))
+            for i in range(0, len(order), batch_size):
+                batch = order[i:i + batch_size]
+                yield features[batch], targets[batch]
+
+def build_model(input_dim):
+    model = Sequential([
+        Dense(64, input_dim=input_dim, activation='relu'),
+        Dropout(0.3),
+        Dense(32, activation='relu'),
+        Dropout(0.2),
+        Dense(16, activation='relu'),
+        Dense(1, activation='sigmoid')
+    ])
     
-    return df
+    model.compile(
+        optimizer=Adam(learning_rate=0.001),
+        loss='binary_crossentropy',
+        metrics=['accuracy', 'Precision', 'Recall']
+    )
+    return model
+
+def create_streaming_fraud_detection_model(data_dir, epochs=15, batch_size=1024, validation_split=0.2):
+    """Train from memory-mapped columns without loading the dataset"""
+    columns, labels = open_fraud_dataset(data_dir)
+    num_samples = len(labels)
+    # Rows are i.i.d., so the tail serves as the validation set
+    split = int(num_samples * (1 - validation_split))
+    
+    scaler = fit_streaming_scaler(columns, labels, split)
+    joblib.dump(scaler, 'fraud_scaler.pkl')
+    
+    model = build_model(len(FEATURE_COLUMNS))
+    history = model.fit(
+        stream_batches(columns, labels, scaler, 0, split, batch_size),
+        steps_per_epoch=-(-split // batch_size),
+        validation_data=stream_batches(columns, labels, scaler, split, num_samples, batch_size, shuffle=False),
+        validation_steps=-(-(num_samples - split) // batch_size),
+        epochs=epochs,
+        class_weight={0: 1, 1: 10}  # Weight fraud class higher
+    )
+    
+    return model, history, scaler
 
 # Create and train fraud detection model
 def create_fraud_detection_model():
@@ -74,21 +169,7 @@ def create_fraud_detection_model():
     joblib.dump(scaler, 'fraud_scaler.pkl')
     
     # Create model
-    model = Sequential([
-        Dense(64, input_dim=X_train.shape[1], activation='relu'),
-        Dropout(0.3),
-        Dense(32, activation='relu'),
-        Dropout(0.2),
-        Dense(16, activation='relu'),
-        Dense(1, activation='sigmoid')
-    ])
-    
-    # Compile model
-    model.compile(
-        optimizer=Adam(learning_rate=0.001),
-        loss='binary_crossentropy',
-        metrics=['accuracy', 'Precision', 'Recall']
-    )
+    model = build_model(X_train.shape[1])
     
     # Train model
     history = model.fit(
@@ -99,14 +180,76 @@ def create_fraud_detection_model():
         class_weight={0: 1, 1: 10}  # Weight fraud class higher
     )
     
-    return model, history
+    return model, history, scaler
+
+def export_numpy_model(model, scaler, path='fraud_detector.npz', precision='float32'):
+    """Write Dense weights and scaler parameters for the NumPy runtime.
+    
+    precision='int8' stores int8 weights with per-column scales, a quarter
+    of the float32 size.
+    """
+    arrays = {}
+    activations = []
+    # Dropout layers have no weights and are inactive at inference
+    dense_layers = [layer for layer in model.layers if layer.get_weights()]
+    for i, layer in enumerate(dense_layers):
+        weights, bias = layer.get_weights()
+        if precision == 'int8':
+            arrays[f'W{i}'], arrays[f'W{i}_scale'] = quantize_weights(weights)
+        else:
+            arrays[f'W{i}'] = weights
+        arrays[f'b{i}'] = bias
+        activations.append(layer.get_config()['activation'])
+    
+    np.savez_compressed(
+        path,
+        activations=np.array(activations),
+        scaler_mean=scaler.mean_,
+        scaler_scale=scaler.scale_,
+        **arrays
+    )
+    return path
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--export-only", action="store_true",
+                        help="Export an existing fraud_detector.h5 and fraud_scaler.pkl to .npz")
+    parser.add_argument("--data-dir",
+                        help="Train from memory-mapped columns in this directory instead of in memory")
+    parser.add_argument("--generate", type=int, metavar="ROWS",
+                        help="First write ROWS synthetic transactions to --data-dir")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=15)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--export-precision", choices=["float32", "int8"], default="float32",
+                        help="Weight storage in fraud_detector.npz")
+    args = parser.parse_args()
+    
+    if args.export_only:
+        from tensorflow.keras.models import load_model
+        model = load_model('fraud_detector.h5')
+        scaler = joblib.load('fraud_scaler.pkl')
+        export_numpy_model(model, scaler, precision=args.export_precision)
+        print("NumPy fraud model saved as fraud_detector.npz")
+        raise SystemExit(0)
+    
+    if args.generate:
+        if not args.data_dir:
+            parser.error("--generate requires --data-dir")
+        write_fraud_dataset(args.data_dir, args.generate, args.chunk_size, args.workers)
+    
     # Create and save model
-    model, history = create_fraud_detection_model()
+    if args.data_dir:
+        model, history, scaler = create_streaming_fraud_detection_model(
+            args.data_dir, epochs=args.epochs, batch_size=args.batch_size
+        )
+    else:
+        model, history, scaler = create_fraud_detection_model()
     save_model(model, 'fraud_detector.h5')
+    export_numpy_model(model, scaler, precision=args.export_precision)
     
-    print("Fraud detection model saved as fraud_detector.h5")
+    print("Fraud detection model saved as fraud_detector.h5 (NumPy export: fraud_detector.npz)")
     print("Model Summary:")
     model.summary()
     
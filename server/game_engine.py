@@ -4,7 +4,7 @@ import json
 import uuid
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 
 # In-memory data stores (replace with database in production)
 active_battles: Dict[str, dict] = {}
@@ -13,8 +13,13 @@ tournaments: Dict[str, dict] = {}
 battle_queue: List[str] = []  # Player IDs waiting for matchmaking
 ai_players: List[dict] = []
 
+# Sponsorship package price by tournament difficulty, quoted to sponsors
+SPONSORSHIP_FEES = {"easy": 500, "medium": 1000, "hard": 2500, "elite": 5000}
+
 class GameEngine:
     def __init__(self):
+        # Callbacks notified when cached read data changes
+        self.change_listeners: List[Callable[..., None]] = []
         # Initialize AI players
         self.initialize_ai_players()
         # Start background tasks
@@ -330,6 +335,12 @@ class GameEngine:
             if player_id in player_stats:
                 self.check_level_up(player_id)
         
+        self.notify_change(
+            "leaderboard",
+            f"player:{battle['player1']}",
+            f"player:{battle['player2']}"
+        )
+        
         # Clean up after delay
         await asyncio.sleep(30)  # Keep battle data for 30 seconds
         if battle_id in active_battles:
@@ -372,6 +383,7 @@ class GameEngine:
         }
         
         tournaments[tournament_id] = tournament
+        self.notify_change("tournaments")
         return tournament
 
     async def start_tournament(self, tournament_id: str):
@@ -386,6 +398,7 @@ class GameEngine:
         
         # Initialize prize pool
         tournament["prize_pool"] = tournament["entry_fee"] * len(tournament["participants"])
+        self.notify_change("tournaments", f"tournament:{tournament_id}")
         
         # Create tournament bracket
         self.create_tournament_bracket(tournament_id)
@@ -512,6 +525,7 @@ class GameEngine:
         
         tournament["status"] = "completed"
         tournament["end_time"] = datetime.utcnow()
+        self.notify_change("tournaments", f"tournament:{tournament_id}")
         
         # Determine winner (last match winner)
         final_match = None
@@ -531,6 +545,7 @@ class GameEngine:
             # Award runner-up (20% of prize pool)
             runner_up = final_match["player1"] if final_match["winner"] == final_match["player2"] else final_match["player2"]
             player_stats[runner_up]["credits"] += tournament["prize_pool"] * 0.2
+            self.notify_change("leaderboard", f"player:{winner_id}", f"player:{runner_up}")
             
             # Award organization (10%)
             # This would go to the game's revenue
@@ -547,6 +562,7 @@ class GameEngine:
         await asyncio.sleep(3600)  # Keep tournament data for 1 hour
         if tournament_id in tournaments:
             del tournaments[tournament_id]
+            self.notify_change("tournaments", f"tournament:{tournament_id}")
 
     def join_tournament(self, player_id: str, tournament_id: str) -> dict:
         """Register a player for a tournament"""
@@ -566,9 +582,60 @@ class GameEngine:
         # Deduct entry fee
         player["credits"] -= tournament["entry_fee"]
         tournament["participants"].append(player_id)
+        self.notify_change("tournaments", f"tournament:{tournament_id}", f"player:{player_id}")
         
         return {"status": "success", "message": "Joined tournament"}
 
+    def add_change_listener(self, listener: Callable[..., None]):
+        """Register a callback invoked with the tags of data that changed"""
+        self.change_listeners.append(listener)
+
+    def notify_change(self, *tags: str):
+        """Tell listeners (e.g. the response cache) which reads are stale"""
+        for listener in self.change_listeners:
+            listener(*tags)
+
+    def get_upcoming_tournaments(self) -> List[dict]:
+        """List scheduled tournaments ordered by start time"""
+        upcoming = sorted(
+            (t for t in tournaments.values() if t["status"] == "scheduled"),
+            key=lambda t: t["start_time"]
+        )
+        return [
+            {
+                "id": t["id"],
+                "name": t["name"],
+                "difficulty": t["difficulty"],
+                "entry_fee": t["entry_fee"],
+                "date": t["start_time"].isoformat(),
+                "participants": len(t["participants"]),
+                "prize_pool": t["entry_fee"] * len(t["participants"]),
+                "sponsorship_fee": SPONSORSHIP_FEES.get(t["difficulty"], SPONSORSHIP_FEES["medium"]),
+                "sponsor": t["sponsor"]
+            }
+            for t in upcoming
+        ]
+
+    def get_leaderboard(self, limit: int = 100) -> List[dict]:
+        """Top players ranked by level, XP and wins"""
+        ranked = sorted(
+            player_stats.values(),
+            key=lambda p: (p["level"], p["xp"], p["wins"]),
+            reverse=True
+        )[:limit]
+        return [
+            {
+                "rank": i + 1,
+                "id": p["id"],
+                "name": p["name"],
+                "level": p["level"],
+                "xp": p["xp"],
+                "wins": p["wins"],
+                "losses": p["losses"]
+            }
+            for i, p in enumerate(ranked)
+        ]
+
     def get_random_sponsor(self) -> str:
         """Get a random sponsor name"""
         sponsors = [
@@ -604,6 +671,7 @@ class GameEngine:
                 "xp": 0
             }
         }
+        self.notify_change("leaderboard", f"player:{player_id}")
 
     def get_player_stats(self, player_id: str) -> dict:
         """Get player stats, initializing if new"""
@@ -654,6 +722,7 @@ class GameEngine:
         upgrade_amount = 5 if stat == "health" else 1
         player[stat] += upgrade_amount
         player["skill_points"] -= 1
+        self.notify_change(f"player:{player_id}")
         
         return {"status": "success", "message": f"{stat.capitalize()} upgraded!"}
 
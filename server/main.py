@@ -1,9 +1,14 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.security import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from payments import process_payment
-from game_engine import start_battle
+from game_engine import game_engine, battle_queue, player_stats
+from rate_limiter import rate_limiter, load_shedder
+from response_cache import response_cache
 import os
+import math
+import time
 import uvicorn
 
 app = FastAPI(title="ArenaX API", version="1.0.0")
@@ -17,12 +22,47 @@ def get_api_key(api_key: str = Depends(api_key_header)):
         raise HTTPException(status_code=403, detail="Invalid API Key")
     return api_key
 
-# CORS configuration
+def enforce_rate_limit(api_key: str, player_id: str = None):
+    """Reject the request with 429 when the key or player is over budget"""
+    retry_after = rate_limiter.check(api_key, player_id)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+# Stale cached reads are dropped as soon as the engine mutates them
+game_engine.add_change_listener(response_cache.invalidate)
+
+@app.on_event("startup")
+async def start_load_shedder():
+    load_shedder.start()
+
+@app.middleware("http")
+async def shed_load(request: Request, call_next):
+    """Fail fast with 429 while the server is overloaded"""
+    if request.url.path != "/health" and load_shedder.should_shed(len(battle_queue)):
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Server overloaded, retry later"},
+            headers={"Retry-After": str(load_shedder.retry_after)}
+        )
+
+    load_shedder.in_flight += 1
+    try:
+        return await call_next(request)
+    finally:
+        load_shedder.in_flight -= 1
+
+# CORS configuration; added after the shedder so it wraps it and 429s
+# reach the browser with CORS headers and a readable Retry-After
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 @app.get("/health")
@@ -31,10 +71,37 @@ def health_check():
 
 @app.post("/battle")
 async def start_player_battle(player_data: dict, api_key: str = Depends(get_api_key)):
-    return start_battle(player_data)
+    enforce_rate_limit(api_key, player_data.get("player_id"))
+    return await game_engine.start_battle(player_data)
+
+# Cached reads are async so they share the event loop with every writer of
+# the engine state, the response cache and the rate limiter; none of those
+# structures are safe to touch from FastAPI's thread pool
+@app.get("/tournaments/upcoming")
+async def upcoming_tournaments(request: Request, api_key: str = Depends(get_api_key)):
+    enforce_rate_limit(api_key)
+    return response_cache.respond(request, ["tournaments"], game_engine.get_upcoming_tournaments)
+
+@app.get("/leaderboard")
+async def leaderboard(request: Request, limit: int = 100, api_key: str = Depends(get_api_key)):
+    enforce_rate_limit(api_key)
+    limit = max(1, min(limit, 500))
+    return response_cache.respond(request, ["leaderboard"], lambda: game_engine.get_leaderboard(limit))
+
+@app.get("/players/{player_id}")
+async def player_profile(player_id: str, request: Request, api_key: str = Depends(get_api_key)):
+    enforce_rate_limit(api_key, player_id)
+    def load_profile():
+        player = player_stats.get(player_id)
+        if player is None:
+            raise HTTPException(status_code=404, detail="Player not found")
+        return player
+
+    return response_cache.respond(request, [f"player:{player_id}"], load_profile)
 
 @app.post("/purchase")
 async def handle_purchase(payment_data: dict, api_key: str = Depends(get_api_key)):
+    enforce_rate_limit(api_key, payment_data.get("customer_id"))
     try:
         return await process_payment(payment_data)
     except Exception as e:
@@ -0,0 +1,131 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+class TokenBucket:
+    """Classic token bucket refilled lazily on each request"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def wait_time(self, cost: float = 1.0) -> float:
+        """Seconds until `cost` tokens exist, 0 if they already do"""
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def consume(self, now: float, cost: float = 1.0) -> float:
+        """Take tokens; return 0 on success or seconds until enough tokens exist"""
+        self.refill(now)
+        retry_after = self.wait_time(cost)
+        if not retry_after:
+            self.tokens -= cost
+        return retry_after
+
+class RateLimiter:
+    """Per-key and per-player token buckets with bounded memory"""
+    def __init__(self, key_rate: float, key_burst: float,
+                 player_rate: float, player_burst: float,
+                 max_buckets: int = 100000):
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.player_rate = player_rate
+        self.player_burst = player_burst
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+
+    def get_bucket(self, scope: str, identity: str) -> TokenBucket:
+        """Fetch a bucket, evicting the least recently used one when full"""
+        key = (scope, identity)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if scope == "key":
+                bucket = TokenBucket(self.key_rate, self.key_burst)
+            else:
+                bucket = TokenBucket(self.player_rate, self.player_burst)
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def check(self, api_key: str, player_id: Optional[str] = None) -> float:
+        """Return 0 if the request may proceed, otherwise the Retry-After in seconds.
+
+        Tokens are only taken when every bucket allows the request, so a
+        request rejected by the player bucket does not drain the key budget.
+        """
+        now = time.monotonic()
+        buckets = [self.get_bucket("key", api_key)]
+        if player_id:
+            buckets.append(self.get_bucket("player", player_id))
+
+        for bucket in buckets:
+            bucket.refill(now)
+        retry_after = max(bucket.wait_time() for bucket in buckets)
+        if retry_after:
+            return retry_after
+
+        for bucket in buckets:
+            bucket.tokens -= 1.0
+        return 0.0
+
+class LoadShedder:
+    """Reject work when queue depth or event loop lag exceed their limits"""
+    def __init__(self, max_in_flight: int, max_queue_depth: int, max_loop_lag: float,
+                 probe_interval: float = 0.1, retry_after: int = 1):
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.max_loop_lag = max_loop_lag
+        self.probe_interval = probe_interval
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self.probe_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start measuring event loop lag on the running loop"""
+        if self.probe_task is None:
+            self.probe_task = asyncio.create_task(self.measure_loop_lag())
+
+    async def measure_loop_lag(self):
+        """Sleep for a fixed interval and record how late the loop woke us up"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.probe_interval
+            await asyncio.sleep(self.probe_interval)
+            lag = max(0.0, loop.time() - expected)
+            # Smooth spikes so a single slow tick does not shed traffic
+            self.loop_lag = 0.8 * self.loop_lag + 0.2 * lag
+
+    def should_shed(self, queue_depth: int = 0) -> bool:
+        """Decide whether to reject the next request"""
+        if self.in_flight >= self.max_in_flight or queue_depth >= self.max_queue_depth:
+            return True
+        return self.loop_lag > self.max_loop_lag
+
+# Shared instances configured from the environment
+rate_limiter = RateLimiter(
+    key_rate=float(os.getenv('RATE_LIMIT_KEY_RPS', '50')),
+    key_burst=float(os.getenv('RATE_LIMIT_KEY_BURST', '100')),
+    player_rate=float(os.getenv('RATE_LIMIT_PLAYER_RPS', '2')),
+    player_burst=float(os.getenv('RATE_LIMIT_PLAYER_BURST', '5')),
+)
+load_shedder = LoadShedder(
+    max_in_flight=int(os.getenv('SHED_MAX_IN_FLIGHT', '500')),
+    max_queue_depth=int(os.getenv('SHED_MAX_QUEUE_DEPTH', '5000')),
+    max_loop_lag=float(os.getenv('SHED_MAX_LOOP_LAG', '0.25')),
+)
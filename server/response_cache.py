@@ -0,0 +1,86 @@
+import os
+import json
+import time
+import hashlib
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+from fastapi import Request, Response
+
+class CacheEntry:
+    __slots__ = ("body", "etag", "expires", "tags")
+
+    def __init__(self, body: bytes, etag: str, expires: float, tags: Tuple[str, ...]):
+        self.body = body
+        self.etag = etag
+        self.expires = expires
+        self.tags = tags
+
+class ResponseCache:
+    """Short-TTL cache of serialized read responses with tag-based invalidation"""
+    def __init__(self, ttl: float = 5.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: Dict[str, CacheEntry] = {}
+        self.tag_index: Dict[str, Set[str]] = {}
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires < time.monotonic():
+            self.evict(key)
+            return None
+        return entry
+
+    def put(self, key: str, payload, tags: Iterable[str] = (), ttl: Optional[float] = None) -> CacheEntry:
+        """Serialize a payload once and store it with its ETag"""
+        body = json.dumps(payload, default=str, separators=(",", ":")).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        entry = CacheEntry(body, etag, time.monotonic() + (ttl or self.ttl), tuple(tags))
+
+        self.evict(key)
+        if len(self.entries) >= self.max_entries:
+            # Dicts keep insertion order, so the first key is the oldest entry
+            self.evict(next(iter(self.entries)))
+        self.entries[key] = entry
+        for tag in entry.tags:
+            self.tag_index.setdefault(tag, set()).add(key)
+        return entry
+
+    def evict(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self.tag_index.get(tag)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_index[tag]
+
+    def invalidate(self, *tags: str):
+        """Drop every cached response carrying any of the given tags"""
+        for tag in tags:
+            for key in list(self.tag_index.get(tag, ())):
+                self.evict(key)
+
+    def respond(self, request: Request, tags: Iterable[str], build: Callable[[], object]) -> Response:
+        """Serve a cached read, honouring If-None-Match with 304"""
+        key = request.url.path
+        if request.url.query:
+            key += "?" + request.url.query
+
+        entry = self.get(key)
+        if entry is None:
+            entry = self.put(key, build(), tags)
+
+        headers = {
+            "ETag": entry.etag,
+            # Responses sit behind X-API-Key, so shared caches must not keep them
+            "Cache-Control": f"private, max-age={int(self.ttl)}"
+        }
+        if request.headers.get("if-none-match") == entry.etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+# Shared cache for read endpoints
+response_cache = ResponseCache(ttl=float(os.getenv('RESPONSE_CACHE_TTL', '5')))